@@ -0,0 +1,186 @@
+import base64
+import binascii
+import gzip
+
+from flask import Blueprint, Response, jsonify, request
+
+from database import APPLICATION_COLUMNS
+from export import parse_date
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+API_PREFIX = '/api/v1'
+
+APPLICATION_FIELDS = ['id', *APPLICATION_COLUMNS, 'status', 'score', 'submission_date']
+DEFAULT_APPLICATION_FIELDS = ['id', 'name', 'email', 'phone', 'company_name', 'loan_amount',
+                              'tenure', 'status', 'submission_date']
+
+FILE_FIELDS = ['id', 'application_id', 'file_type', 'file_path', 'file_size', 'file_hash',
+               'upload_date', 'file_password']
+# Passwords are only returned when asked for explicitly
+DEFAULT_FILE_FIELDS = [field for field in FILE_FIELDS if field != 'file_password']
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Responses smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def parse_fields(allowed, default):
+    """Sparse fieldset from ?fields=a,b,c, validated against a whitelist"""
+    value = request.args.get('fields')
+    if not value:
+        return default
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, binascii.Error):
+        raise ApiError('Invalid cursor')
+
+
+def _page_size():
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ApiError('limit must be an integer')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def _json_response(body, status=200):
+    return Response(body, status=status, mimetype='application/json')
+
+
+def _search_conditions():
+    """WHERE clause for /applications/search from query parameters"""
+    conditions = []
+    params = []
+    for field in ('email', 'phone', 'status'):
+        value = request.args.get(field)
+        if value:
+            conditions.append(f'{field} = ?')
+            params.append(value)
+    name = request.args.get('name')
+    if name:
+        conditions.append("name LIKE ? ESCAPE '\\'")
+        escaped = name.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        params.append(f'{escaped}%')
+    for arg, condition in (('min_amount', 'loan_amount >= ?'), ('max_amount', 'loan_amount <= ?')):
+        value = request.args.get(arg)
+        if value:
+            try:
+                params.append(float(value))
+            except ValueError:
+                raise ApiError(f'{arg} must be a number')
+            conditions.append(condition)
+    for arg, condition in (('submitted_after', 'submission_date >= ?'),
+                           ('submitted_before', "submission_date < date(?, '+1 day')")):
+        try:
+            value = parse_date(request.args.get(arg), arg)
+        except ValueError as e:
+            raise ApiError(str(e))
+        if value:
+            conditions.append(condition)
+            params.append(value)
+    return conditions, params
+
+
+def compress_response(response):
+    """Brotli or gzip encode JSON responses the client accepts"""
+    if (response.direct_passthrough or response.status_code < 200 or response.status_code >= 300
+            or 'Content-Encoding' in response.headers):
+        return response
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_BYTES:
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        response.set_data(brotli.compress(data, quality=4))
+        response.headers['Content-Encoding'] = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(data, compresslevel=5))
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        return response
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def create_api_blueprint(database):
+    """Versioned JSON API over a LoanDatabase"""
+    api = Blueprint('api_v1', __name__, url_prefix=API_PREFIX)
+
+    def page(fields, conditions, params):
+        limit = _page_size()
+        cursor = request.args.get('cursor')
+        if cursor:
+            conditions = [*conditions, 'id < ?']
+            params = [*params, decode_cursor(cursor)]
+        # The id comes back beside each row for the cursor; fetch one extra row to detect the end
+        rows = database.fetch_json_rows('applications', fields, ' AND '.join(conditions),
+                                        params, 'id DESC', limit + 1, with_id=True)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][0]) if has_more else None
+        body = '{"data":[' + ','.join(row[1] for row in rows) + '],"next_cursor":' + \
+               (f'"{next_cursor}"' if next_cursor else 'null') + '}'
+        return _json_response(body)
+
+    @api.route('/applications')
+    def list_applications():
+        fields = parse_fields(APPLICATION_FIELDS, DEFAULT_APPLICATION_FIELDS)
+        return page(fields, [], [])
+
+    @api.route('/applications/search')
+    def search_applications():
+        fields = parse_fields(APPLICATION_FIELDS, DEFAULT_APPLICATION_FIELDS)
+        conditions, params = _search_conditions()
+        if not conditions:
+            raise ApiError('Provide at least one search parameter')
+        return page(fields, conditions, params)
+
+    @api.route('/applications/<int:app_id>')
+    def get_application(app_id):
+        fields = parse_fields(APPLICATION_FIELDS, APPLICATION_FIELDS)
+        rows = database.fetch_json_rows('applications', fields, 'id = ?', (app_id,))
+        if not rows:
+            raise ApiError('Application not found', 404)
+        return _json_response('{"data":' + rows[0] + '}')
+
+    @api.route('/applications/<int:app_id>/files')
+    def get_application_files(app_id):
+        fields = parse_fields(FILE_FIELDS, DEFAULT_FILE_FIELDS)
+        if not database.get_application_version(app_id):
+            raise ApiError('Application not found', 404)
+        rows = database.fetch_json_rows('file_uploads', fields, 'application_id = ?', (app_id,), 'id')
+        return _json_response('{"data":[' + ','.join(rows) + ']}')
+
+    @api.errorhandler(ApiError)
+    def api_error(error):
+        return jsonify({'error': error.message}), error.status
+
+    api.after_request(compress_response)
+    return api
@@ -1,57 +1,76 @@
-from flask import Flask, request, render_template, redirect, url_for, flash, jsonify
+from flask import Flask, Request, request, render_template, redirect, url_for, flash, jsonify, Response, stream_with_context, g
 import os
 import sqlite3
 from werkzeug.utils import secure_filename
-from datetime import datetime
-import tempfile
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.exceptions import HTTPException
+from datetime import datetime, timezone
 import traceback
+import hashlib
+import math
+import time
+import zipfile
+from markupsafe import Markup
 
 # Import your custom modules
 from database import db, LoanDatabase
 from email_service import email_service
+from config import (UPLOAD_FOLDER, DATABASE_PATH, RATE_LIMIT_DB_PATH, RATE_LIMITS, ADMISSION_CONTROL,
+                    ADMISSION_MAX_IN_FLIGHT, ADMISSION_LATENCY_THRESHOLD, ADMISSION_SLOT_TIMEOUT,
+                    EMAIL_DELIVERY,
+                    IDEMPOTENCY_PROCESSING_TIMEOUT, BULK_IMPORT_MAX_BYTES)
+from export import export_applications, EXPORT_FORMATS
+from validation import FILE_TYPES, allowed_file, validate_application_data, extract_file_passwords
+from storage import user_folder_path, file_sha256
+from cache import fragment_cache, make_etag, parse_db_timestamp, conditional_response
+from api import create_api_blueprint
+from rate_limit import RateLimiter, AdmissionController, parse_limit
+from pdf_inspector import InspectionPool
+from bulk_import import BulkImporter, iter_records, detect_format, enqueue_notification, IMPORT_FORMATS
+from async_services import send_notification_in_background
+
+# Endpoints allowed larger request bodies than MAX_CONTENT_LENGTH
+ENDPOINT_CONTENT_LIMITS = {'bulk_import': BULK_IMPORT_MAX_BYTES}
+
+class LoanRequest(Request):
+    """Request whose body size limit depends on the matched endpoint"""
+    
+    @property
+    def max_content_length(self):
+        return content_length_limit(self.endpoint)
 
 app = Flask(__name__)
+app.request_class = LoanRequest
 app.secret_key = os.environ.get('SECRET_KEY', 'bank-loan-app-secret-2024')
 
-# Configuration for Render.com
-if os.environ.get('RENDER'):
-    # Production configuration for Render
-    UPLOAD_FOLDER = os.path.join(tempfile.gettempdir(), 'loan_uploads')
-    DATABASE_PATH = os.path.join(tempfile.gettempdir(), 'loan_applications.db')
-else:
-    # Local development configuration
-    UPLOAD_FOLDER = 'uploads'
-    DATABASE_PATH = 'loan_applications.db'
-
-ALLOWED_EXTENSIONS = {'pdf'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024  # 10MB max file size
 app.config['DATABASE_PATH'] = DATABASE_PATH
 
+def content_length_limit(endpoint):
+    """Largest request body accepted for an endpoint (also used by asgi.py)"""
+    return ENDPOINT_CONTENT_LIMITS.get(endpoint, app.config['MAX_CONTENT_LENGTH'])
+
 # Ensure upload directory exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-# File type mapping
-FILE_TYPES = {
-    'aadhar': 'Aadhar Card',
-    'pan': 'PAN Card',
-    'salary_slips': 'Salary Slips',
-    'bank_statement': 'Bank Statement',
-    'offer_letter': 'Offer Letter',
-    'relieving_letter': 'Relieving Letter'
-}
-
-def allowed_file(filename):
-    """Check if file extension is allowed"""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+# Render terminates TLS in a proxy; trust its X-Forwarded-For so limits key on the real client
+if os.environ.get('RENDER'):
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
+
+# Rate limiting and admission control
+rate_limiter = RateLimiter(RATE_LIMIT_DB_PATH)
+route_limits = {endpoint: parse_limit(spec) for endpoint, spec in RATE_LIMITS.items()}
+SHED_ENDPOINTS = {'apply_loan', 'test_email'}
+admission = AdmissionController(
+    RATE_LIMIT_DB_PATH, ADMISSION_MAX_IN_FLIGHT, ADMISSION_LATENCY_THRESHOLD, slot_timeout=ADMISSION_SLOT_TIMEOUT
+) if ADMISSION_CONTROL else None
 
 def save_uploaded_files(application_id, name, files, file_passwords):
     """Save uploaded files with Render.com compatibility"""
     try:
         # Create user folder
-        safe_name = "".join(c for c in name if c.isalnum() or c in (' ', '-', '_')).rstrip()
-        user_folder = os.path.join(app.config['UPLOAD_FOLDER'], f"{safe_name}_{application_id}")
+        user_folder = user_folder_path(app.config['UPLOAD_FOLDER'], name, application_id)
         
         # Ensure directory exists
         os.makedirs(user_folder, exist_ok=True)
@@ -75,8 +94,13 @@ def save_uploaded_files(application_id, name, files, file_passwords):
                     # Get password for this file
                     password = file_passwords.get(file_field, 'No password')
                     
+                    # Record size and hash alongside the file
+                    file_size = os.path.getsize(file_path)
+                    file_hash = file_sha256(file_path)
+                    
                     # Save to database
-                    db.save_file_record(application_id, FILE_TYPES.get(file_field, file_field), file_path, password)
+                    db.save_file_record(application_id, FILE_TYPES.get(file_field, file_field), file_path, password,
+                                        file_size, file_hash)
                     
                     # Add to file data for email
                     file_data.append({
@@ -98,6 +122,69 @@ def save_uploaded_files(application_id, name, files, file_passwords):
         print(f"❌ Error in file upload process: {e}")
         return []
 
+# Idempotency keys are opaque client strings; cap the length we store
+MAX_IDEMPOTENCY_KEY_LENGTH = 128
+
+def get_idempotency_key():
+    """Idempotency key from the Idempotency-Key header or form field"""
+    key = (request.headers.get('Idempotency-Key') or request.form.get('idempotency_key') or '').strip()
+    return key[:MAX_IDEMPOTENCY_KEY_LENGTH] or None
+
+def request_fingerprint(form):
+    """Hash of the submitted fields, to catch a key reused for different data"""
+    digest = hashlib.sha256()
+    for field in sorted(form.keys()):
+        if field == 'idempotency_key':
+            continue
+        for value in form.getlist(field):
+            digest.update(f"{field}={value}\0".encode('utf-8'))
+    return digest.hexdigest()
+
+def idempotent_replay(record, request_hash):
+    """Response for a retried request whose key is already stored"""
+    if record['request_hash'] != request_hash:
+        return jsonify({
+            'success': False,
+            'error': 'Idempotency key was already used for a different application'
+        }), 422
+    if record['response_body'] is None:
+        started_at = parse_db_timestamp(record['created_at'])
+        if started_at and (datetime.now(timezone.utc) - started_at).total_seconds() > IDEMPOTENCY_PROCESSING_TIMEOUT:
+            return recovered_response(record)
+        # The first request is still running (e.g. waiting on SMTP)
+        return jsonify({
+            'success': False,
+            'error': 'This application is still being processed. Please wait.',
+            'application_id': record['application_id']
+        }), 409
+    print(f"♻️ Replaying stored response for application {record['application_id']}")
+    response = app.response_class(record['response_body'], status=record['status_code'],
+                                  mimetype='application/json')
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def saved_application_response(idempotency_key, application_id):
+    """Success response for a saved application whose request did not finish, stored for the key"""
+    response = jsonify({
+        'success': True,
+        'application_id': application_id,
+        'message': 'Application submitted successfully! Our team will contact you soon.',
+        'files_uploaded': len(db.get_application_files(application_id)),
+        'email_sent': False,
+        'email_queued': False,
+        'email_error': None
+    })
+    db.save_idempotent_response(idempotency_key, response.status_code, response.get_data(as_text=True))
+    return response
+
+def recovered_response(record):
+    """Success response for a key whose first request died after saving the application"""
+    application_id = record['application_id']
+    print(f"♻️ Recovering application {application_id}: its first request never finished")
+    response = saved_application_response(record['idempotency_key'], application_id)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
 # Routes
 @app.route('/')
 def index():
@@ -115,74 +202,44 @@ def apply_loan():
     print("🚀 Loan application submission started...")
     
     if request.method == 'POST':
+        idempotency_key = None
+        application_id = None
         try:
             # Log basic request info
             print(f"📝 Form fields received: {len(request.form)}")
             print(f"📁 Files received: {len([f for f in request.files.values() if f and f.filename])}")
             
-            # Extract form data with validation
-            required_fields = [
-                'name', 'dob', 'phone', 'mother_name', 'qualification', 'email',
-                'present_address', 'present_years', 'permanent_address', 'permanent_years',
-                'total_experience', 'company_experience', 'company_name', 'company_address',
-                'designation', 'office_contact', 'official_email', 'bank_name', 'bank_years',
-                'branch', 'loan_amount', 'tenure', 'friend_name', 'friend_contact',
-                'friend_address', 'relative_name', 'relative_contact', 'relative_address'
-            ]
-            
-            form_data = {}
-            missing_fields = []
+            # Retries with a known idempotency key get the original response
+            idempotency_key = get_idempotency_key()
+            request_hash = request_fingerprint(request.form) if idempotency_key else None
+            if idempotency_key:
+                record = db.get_idempotency_record(idempotency_key)
+                if record:
+                    return idempotent_replay(record, request_hash)
             
-            for field in required_fields:
-                value = request.form.get(field, '').strip()
-                if not value:
-                    missing_fields.append(field)
-                form_data[field] = value
-            
-            if missing_fields:
-                error_msg = f"Missing required fields: {', '.join(missing_fields)}"
-                print(f"❌ {error_msg}")
-                return jsonify({
-                    'success': False, 
-                    'error': error_msg
-                }), 400
+            # Extract form data with validation
+            form_data, error_msg = validate_application_data(request.form)
             
-            # Convert numeric fields
-            try:
-                form_data['present_years'] = float(form_data['present_years'])
-                form_data['permanent_years'] = float(form_data['permanent_years'])
-                form_data['total_experience'] = float(form_data['total_experience'])
-                form_data['company_experience'] = float(form_data['company_experience'])
-                form_data['bank_years'] = float(form_data['bank_years'])
-                form_data['loan_amount'] = float(form_data['loan_amount'])
-                form_data['tenure'] = int(form_data['tenure'])
-            except ValueError as e:
-                error_msg = f"Invalid number format: {str(e)}"
+            if error_msg:
                 print(f"❌ {error_msg}")
                 return jsonify({
                     'success': False, 
                     'error': error_msg
                 }), 400
             
-            # Optional fields
-            form_data['alt_phone'] = request.form.get('alt_phone', '').strip()
-            form_data['landmark'] = request.form.get('landmark', '').strip()
-            form_data['existing_loan'] = request.form.get('existing_loan', '').strip()
-            
             # Get file passwords
-            file_passwords = {
-                'aadhar': request.form.get('aadhar_password', 'No password').strip(),
-                'pan': request.form.get('pan_password', 'No password').strip(),
-                'salary_slips': request.form.get('salary_slips_password', 'No password').strip(),
-                'bank_statement': request.form.get('bank_statement_password', 'No password').strip(),
-                'offer_letter': request.form.get('offer_letter_password', 'No password').strip(),
-                'relieving_letter': request.form.get('relieving_letter_password', 'No password').strip()
-            }
+            file_passwords = extract_file_passwords(request.form)
             
             print("✅ Form data validation passed")
             
             # Save to database
-            application_id = db.save_application(form_data)
+            application_id = db.save_application(form_data, idempotency_key, request_hash)
+            
+            if not application_id and idempotency_key:
+                # Lost a race with a concurrent retry carrying the same key
+                record = db.get_idempotency_record(idempotency_key)
+                if record:
+                    return idempotent_replay(record, request_hash)
             
             if not application_id:
                 error_msg = "Failed to save application to database"
@@ -193,6 +250,7 @@ def apply_loan():
                 }), 500
             
             print(f"✅ Application saved with ID: {application_id}")
+            fragment_cache.invalidate('applications')
             
             # Handle file uploads
             files_data = []
@@ -213,8 +271,16 @@ def apply_loan():
                 print(f"⚠️ File upload error (non-critical): {file_error}")
                 # Continue processing even if file upload fails
             
+            # Check the stored PDFs in the background
+            if files_data:
+                try:
+                    inspection_pool.submit_application(application_id)
+                except Exception as inspection_error:
+                    print(f"⚠️ Could not queue document inspection: {inspection_error}")
+            
             # Send email notification
             email_sent = False
+            email_queued = False
             email_error = None
             
             try:
@@ -222,6 +288,11 @@ def apply_loan():
                 
                 if not email_service.is_configured():
                     print("⚠️ Email not configured - skipping email notification")
+                elif EMAIL_DELIVERY == 'background':
+                    # SMTP can take seconds; don't hold the request thread for it
+                    send_notification_in_background(email_service, application_id, form_data, files_data)
+                    email_queued = True
+                    print(f"📨 Email queued for application {application_id}")
                 else:
                     print("✅ Email service is configured - attempting to send...")
                     email_sent = email_service.send_application_notification(application_id, form_data, files_data)
@@ -238,51 +309,171 @@ def apply_loan():
             
             print(f"🎉 Application {application_id} processed successfully!")
             
-            return jsonify({
+            response = jsonify({
                 'success': True, 
                 'application_id': application_id,
                 'message': 'Application submitted successfully! Our team will contact you soon.',
                 'files_uploaded': len(files_data),
                 'email_sent': email_sent,
+                'email_queued': email_queued,
                 'email_error': email_error if email_error else None
             })
+            if idempotency_key:
+                db.save_idempotent_response(idempotency_key, response.status_code, response.get_data(as_text=True))
+            return response
             
+        except HTTPException:
+            # e.g. 413 from the body size limit; let the error handlers answer it
+            raise
         except Exception as e:
             error_msg = f"Unexpected error: {str(e)}"
             print(f"❌ {error_msg}")
             print(traceback.format_exc())
             
-            return jsonify({
+            response = jsonify({
                 'success': False, 
                 'error': 'An unexpected error occurred. Please try again.',
-                'debug_error': str(e)
-            }), 500
+                'debug_error': str(e),
+                'application_id': application_id
+            })
+            response.status_code = 500
+            if idempotency_key and application_id:
+                # The application row exists: retries should get the success it amounts to,
+                # not replay this 500 forever
+                try:
+                    saved_application_response(idempotency_key, application_id)
+                except Exception as store_error:
+                    # Left pending; idempotent_replay recovers it after the processing timeout
+                    print(f"❌ Could not store response for application {application_id}: {store_error}")
+            return response
 
 @app.route('/admin/applications')
 def admin_applications():
     """Admin view to see all applications"""
     try:
-        applications = db.get_all_applications()
-        return render_template('admin.html', applications=applications)
+        version = db.get_applications_version()
+        if version is None:
+            raise RuntimeError('could not read applications')
+        count, max_id, latest_submission = version
+        etag = make_etag('applications', count, max_id, latest_submission)
+        
+        def render():
+            # Whole page cached per table version; rows cached individually so a
+            # new submission only renders its own row
+            def render_page():
+                applications = db.get_all_applications()
+                rows = [render_application_row(app_row) for app_row in applications]
+                return render_template('admin.html', applications=applications, rows=rows)
+            return fragment_cache.get_or_render(('applications', None, etag), render_page)
+        
+        return conditional_response(etag, parse_db_timestamp(latest_submission), render)
     except Exception as e:
         return f"Error accessing applications: {str(e)}", 500
 
+def render_application_row(application):
+    """Rendered admin table row, cached per application version"""
+    key = ('application_row', application['id'], application['submission_date'], application['status'])
+    html = fragment_cache.get_or_render(key, lambda: render_template('_application_row.html', app=application))
+    return Markup(html)
+
 @app.route('/admin/application/<int:app_id>')
 def view_application(app_id):
     """View specific application details"""
     try:
-        application = db.get_application(app_id)
-        files = db.get_application_files(app_id)
+        version = db.get_application_version(app_id)
         
-        if not application:
+        if not version:
             return "Application not found", 404
-            
-        return render_template('application_detail.html', 
-                             application=application, 
-                             files=files)
+        
+        etag = make_etag('application', *version)
+        # Submission, latest upload and latest inspection: any of them changes the page
+        last_modified = parse_db_timestamp(max(value or '' for value in (version[1], version[6], version[7])))
+        
+        def render():
+            def render_page():
+                application = db.get_application(app_id)
+                files = db.get_application_files(app_id)
+                return render_template('application_detail.html', 
+                                     application=application, 
+                                     files=files)
+            return fragment_cache.get_or_render(('application', app_id, etag), render_page)
+        
+        return conditional_response(etag, last_modified, render)
     except Exception as e:
         return f"Error viewing application: {str(e)}", 500
 
+@app.route('/admin/export')
+def export_data():
+    """Stream applications as CSV, NDJSON or Parquet"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unsupported format: {fmt}"}), 400
+    
+    try:
+        batch_size = int(request.args.get('batch_size', 1000))
+        chunks = export_applications(
+            db, fmt,
+            columns=request.args.get('columns'),
+            start_date=request.args.get('start_date'),
+            end_date=request.args.get('end_date'),
+            batch_size=max(1, min(batch_size, 10000))
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    filename = f"applications_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@app.route('/admin/import', methods=['POST'])
+def bulk_import():
+    """Bulk import partner applications from an NDJSON or CSV batch"""
+    try:
+        batch = request.files.get('data')
+        documents = request.files.get('documents')
+        
+        if batch:
+            stream = batch.stream
+            fmt = request.args.get('format') or detect_format(batch.filename, batch.content_type)
+        else:
+            # Raw NDJSON/CSV request body
+            stream = request.stream
+            fmt = request.args.get('format') or detect_format(content_type=request.content_type)
+        
+        if fmt not in IMPORT_FORMATS:
+            return jsonify({
+                'success': False,
+                'error': f"Unsupported or unknown import format; use one of: {', '.join(IMPORT_FORMATS)}"
+            }), 400
+        
+        importer = BulkImporter(db, app.config['UPLOAD_FOLDER'], documents.stream if documents else None)
+        importer.run(iter_records(stream, fmt))
+        summary = importer.summary()
+        fragment_cache.invalidate('applications')
+        
+        for imported in importer.imported:
+            if imported['files_uploaded']:
+                inspection_pool.submit_application(imported['application_id'])
+        
+        enqueue_notification(email_service, importer.imported)
+        
+        print(f"📦 Bulk import finished: {summary['imported']} imported, {summary['failed']} failed")
+        return jsonify({'success': True, **summary})
+        
+    except zipfile.BadZipFile:
+        return jsonify({'success': False, 'error': 'Documents must be a zip archive'}), 400
+    except HTTPException:
+        # e.g. 413 from the body size limit; let the error handlers answer it
+        raise
+    except Exception as e:
+        print(f"❌ Bulk import error: {e}")
+        print(traceback.format_exc())
+        return jsonify({'success': False, 'error': f"Bulk import failed: {str(e)}"}), 500
+
 @app.route('/admin/uploads')
 def admin_uploads():
     """Admin view to see uploads structure"""
@@ -336,7 +527,13 @@ def status():
             'upload_folder': app.config['UPLOAD_FOLDER'],
             'upload_folder_exists': os.path.exists(app.config['UPLOAD_FOLDER']),
             'total_applications': db.get_application_count(),
+            'archived_applications': db.get_archived_count(),
+            'schema_version': db.get_schema_version(),
+            'missing_indexes': db.check_indexes(),
+            'query_plan_warnings': db.check_query_plans(),
             'email_configured': email_service.is_configured(),
+            'fragment_cache': fragment_cache.stats(),
+            'admission_control': admission.stats() if admission else None,
             'environment': 'production' if os.environ.get('RENDER') else 'development',
             'timestamp': datetime.now().isoformat()
         }
@@ -437,11 +634,49 @@ def email_status():
     }
     return jsonify(status)
 
+# Runs before the request body is read, so rejected uploads cost almost nothing
+@app.before_request
+def enforce_limits():
+    endpoint = request.endpoint
+    
+    limit = route_limits.get(endpoint)
+    # The ASGI server (asgi.py) checks the limit before buffering the upload
+    if limit and not request.environ.get('loan.rate_limit_checked'):
+        capacity, refill_rate = limit
+        allowed, retry_after = rate_limiter.allow(f"{endpoint}:{request.remote_addr}", capacity, refill_rate)
+        if not allowed:
+            print(f"🚦 Rate limited {request.remote_addr} on {endpoint}")
+            return rejection_response('Too many requests. Please try again later.', 429, retry_after)
+    
+    if admission and endpoint in SHED_ENDPOINTS:
+        g.admission_slot = admission.try_enter()
+        if g.admission_slot is None:
+            print(f"🚦 Shedding load on {endpoint}: {admission.stats()}")
+            return rejection_response('Server is busy. Please try again shortly.', 503, admission.probe_interval)
+        # Parse the upload before starting the clock, so slow clients don't count as slow processing
+        request.form, request.files
+        g.admitted_at = time.monotonic()
+
+@app.teardown_request
+def release_admission(exc):
+    slot = g.pop('admission_slot', None)
+    if slot is not None:
+        admitted_at = g.pop('admitted_at', None)
+        admission.exit(slot, time.monotonic() - admitted_at if admitted_at is not None else None)
+
+def rejection_response(message, status, retry_after):
+    response = jsonify({'success': False, 'error': message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    # Don't keep the connection around to drain an upload we refused
+    response.headers['Connection'] = 'close'
+    return response
+
 # CORS headers
 @app.after_request
 def after_request(response):
     response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,Idempotency-Key')
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
     return response
 
@@ -469,6 +704,12 @@ try:
 except Exception as e:
     print(f"❌ Database initialization failed: {e}")
 
+# JSON API, registered after the production database is in place
+app.register_blueprint(create_api_blueprint(db))
+
+# Background PDF inspection of uploaded documents
+inspection_pool = InspectionPool(db)
+
 # Production startup
 if __name__ == '__main__':
     # Get port from environment variable (Render provides this)
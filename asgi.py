@@ -0,0 +1,245 @@
+"""ASGI entry point for the async server mode.
+
+Run with ``SERVER_MODE=async gunicorn -c gunicorn.conf.py`` (uvicorn workers).
+Slow clients are handled on the event loop: request bodies are buffered
+asynchronously and the Flask app only gets a thread once the upload is
+complete, so a few thousand trickling uploads no longer pin a worker each.
+Rate limits are checked before the body is read, and /health is answered
+on the loop even when every app thread is busy.
+"""
+import asyncio
+import json
+import math
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from werkzeug.exceptions import HTTPException
+
+from config import ASYNC_APP_THREADS
+from app import app, db, rate_limiter, route_limits, inspection_pool, content_length_limit
+from async_services import db_executor, shutdown_executors
+
+# Upload bodies larger than this are spooled to disk while they arrive
+SPOOL_MAX_BYTES = 1024 * 1024
+
+app_executor = ThreadPoolExecutor(max_workers=ASYNC_APP_THREADS, thread_name_prefix='loan-app')
+
+
+def client_address(scope, headers):
+    """Client IP, taking Render's proxy into account like ProxyFix does in app.py"""
+    if os.environ.get('RENDER') and 'x-forwarded-for' in headers:
+        return headers['x-forwarded-for'].split(',')[-1].strip()
+    client = scope.get('client')
+    return client[0] if client else ''
+
+
+def build_environ(scope, headers, body, body_size):
+    """WSGI environ for an ASGI http scope whose body is already buffered"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('',))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        # The whole body is buffered, so chunked uploads have a known length too
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in headers.items():
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'content-length':
+            environ['HTTP_' + name.upper().replace('-', '_')] = value
+    environ['CONTENT_LENGTH'] = str(body_size)
+    return environ
+
+
+async def send_json(send, status, payload, extra_headers=()):
+    body = json.dumps(payload).encode('utf-8')
+    headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode()),
+               *extra_headers]
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def health(send):
+    """Same response as app.health_check, without waiting for an app thread"""
+    try:
+        loop = asyncio.get_running_loop()
+        db_status = await loop.run_in_executor(db_executor, db.get_application_count) >= 0
+        await send_json(send, 200, {
+            'status': 'healthy',
+            'database': 'connected' if db_status else 'error',
+            'timestamp': datetime.now().isoformat(),
+            'environment': 'production' if os.environ.get('RENDER') else 'development'
+        })
+    except Exception as e:
+        await send_json(send, 500, {
+            'status': 'unhealthy',
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        })
+
+
+def match_endpoint(scope):
+    try:
+        endpoint, _ = app.url_map.bind('localhost').match(scope['path'], scope['method'])
+        return endpoint
+    except HTTPException:
+        return None
+
+
+async def check_rate_limit(scope, endpoint, headers, send):
+    """Apply app.route_limits before the body is read. Returns False if rejected."""
+    limit = route_limits.get(endpoint)
+    if not limit:
+        return True
+    capacity, refill_rate = limit
+    address = client_address(scope, headers)
+    loop = asyncio.get_running_loop()
+    allowed, retry_after = await loop.run_in_executor(
+        db_executor, rate_limiter.allow, f"{endpoint}:{address}", capacity, refill_rate
+    )
+    if allowed:
+        return True
+    print(f"🚦 Rate limited {address} on {endpoint}")
+    await send_json(send, 429, {'success': False, 'error': 'Too many requests. Please try again later.'}, [
+        (b'retry-after', str(max(1, math.ceil(retry_after))).encode()),
+        (b'connection', b'close'),
+    ])
+    return False
+
+
+async def read_body(receive, max_length):
+    """Buffer the request body without blocking a thread.
+
+    Returns (body, size), or (None, size) if the body is too large.
+    """
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    size = 0
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            body.close()
+            raise ConnectionResetError('Client disconnected during upload')
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if max_length is not None and size > max_length:
+            body.close()
+            return None, size
+        body.write(chunk)
+        more_body = message.get('more_body', False)
+    body.seek(0)
+    return body, size
+
+
+def run_wsgi(environ, send, loop):
+    """Run the Flask app in an app thread, streaming its output back to the loop"""
+    response_start = {}
+
+    def start_response(status, response_headers, exc_info=None):
+        response_start['message'] = {
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                        for name, value in response_headers],
+        }
+
+    def push(message):
+        # Wait for each send so a slow client applies backpressure to streamed exports
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    result = app.wsgi_app(environ, start_response)
+    try:
+        started = False
+        for chunk in result:
+            if not chunk:
+                continue
+            if not started:
+                push(response_start['message'])
+                started = True
+            push({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        if not started:
+            push(response_start['message'])
+        push({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+
+
+def shutdown():
+    app_executor.shutdown(wait=True)
+    inspection_pool.shutdown(wait=True)
+    shutdown_executors(wait=True)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            # Off the loop: app threads still finishing a response need it to send
+            await asyncio.get_running_loop().run_in_executor(None, shutdown)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    if scope['path'] == '/health' and scope['method'] == 'GET':
+        await health(send)
+        return
+
+    headers = {}
+    for name, value in scope['headers']:
+        name = name.decode('latin-1')
+        value = value.decode('latin-1')
+        if name in headers:
+            value = headers[name] + ('; ' if name == 'cookie' else ',') + value
+        headers[name] = value
+
+    endpoint = match_endpoint(scope)
+    if not await check_rate_limit(scope, endpoint, headers, send):
+        return
+
+    max_length = content_length_limit(endpoint)
+    content_length = headers.get('content-length', '')
+    if max_length is not None and content_length.isdigit() and int(content_length) > max_length:
+        await send_json(send, 413, {'error': 'File too large'}, [(b'connection', b'close')])
+        return
+
+    try:
+        body, body_size = await read_body(receive, max_length)
+    except ConnectionResetError:
+        return
+    if body is None:
+        await send_json(send, 413, {'error': 'File too large'}, [(b'connection', b'close')])
+        return
+
+    environ = build_environ(scope, headers, body, body_size)
+    environ['loan.rate_limit_checked'] = True
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(app_executor, run_wsgi, environ, send, loop)
+    finally:
+        body.close()
@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from config import DB_EXECUTOR_THREADS, EMAIL_EXECUTOR_THREADS
+
+# SQLite serialises writers anyway, so a few threads are enough for the database
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_THREADS, thread_name_prefix='loan-db')
+email_executor = ThreadPoolExecutor(max_workers=EMAIL_EXECUTOR_THREADS, thread_name_prefix='loan-email')
+
+
+def _send_in_background(send, args, subject):
+    """Run one email send on the email executor, logging failures. Returns its Future."""
+    future = email_executor.submit(send, *args)
+
+    def report(done):
+        try:
+            sent = done.result()
+        except Exception as e:
+            print(f"❌ Background email error for {subject}: {e}")
+            return
+        if not sent:
+            print(f"❌ Background email failed for {subject}")
+
+    future.add_done_callback(report)
+    return future
+
+
+def send_notification_in_background(service, application_id, application_data, files_data):
+    """Queue an application email on the email executor and return its Future"""
+    return _send_in_background(service.send_application_notification,
+                               (application_id, application_data, files_data), f"application {application_id}")
+
+
+def send_bulk_notification_in_background(service, imported):
+    """Queue a bulk import summary email on the email executor and return its Future"""
+    return _send_in_background(service.send_bulk_import_notification,
+                               (imported,), f"bulk import of {len(imported)} applications")
+
+
+def shutdown_executors(wait=True):
+    db_executor.shutdown(wait=wait)
+    email_executor.shutdown(wait=wait)
@@ -0,0 +1,246 @@
+import argparse
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import tarfile
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from config import DATABASE_PATH, UPLOAD_FOLDER, BACKUP_FOLDER
+from storage import file_sha256
+
+# Pages copied per backup step; the source is only read-locked during a step
+BACKUP_PAGES_PER_STEP = 256
+
+# Pause between steps so writers can take the lock
+BACKUP_STEP_PAUSE = 0.005
+
+DATABASE_OBJECT = 'database.db.gz'
+MANIFEST_NAME = 'manifest.json'
+
+# Backup layout (a local stand-in for an object store):
+#   <root>/objects/ab/abcdef....gz       content-addressed, gzip-compressed files
+#   <root>/snapshots/<id>/manifest.json  upload tree: relative path -> hash, size, mtime
+#   <root>/snapshots/<id>/database.db.gz online copy of the SQLite database
+
+
+def backup_database(source_path, dest_path, pages=BACKUP_PAGES_PER_STEP, pause=BACKUP_STEP_PAUSE):
+    """Copy a live SQLite database with the online backup API in small steps"""
+    def progress(status, remaining, total):
+        if pause:
+            time.sleep(pause)
+
+    source = sqlite3.connect(source_path)
+    dest = sqlite3.connect(dest_path)
+    try:
+        source.backup(dest, pages=pages, progress=progress)
+    finally:
+        dest.close()
+        source.close()
+
+
+def _compress_file(source_path, dest_path):
+    tmp_path = f"{dest_path}.tmp"
+    with open(source_path, 'rb') as source, gzip.open(tmp_path, 'wb', compresslevel=6) as dest:
+        shutil.copyfileobj(source, dest, 1024 * 1024)
+    os.replace(tmp_path, dest_path)
+
+
+def _decompress_file(source_path, dest_path):
+    tmp_path = f"{dest_path}.tmp"
+    with gzip.open(source_path, 'rb') as source, open(tmp_path, 'wb') as dest:
+        shutil.copyfileobj(source, dest, 1024 * 1024)
+    os.replace(tmp_path, dest_path)
+
+
+def _object_path(backup_root, file_hash):
+    return os.path.join(backup_root, 'objects', file_hash[:2], f"{file_hash}.gz")
+
+
+def list_snapshots(backup_root):
+    """Snapshot IDs, oldest first"""
+    snapshots_dir = os.path.join(backup_root, 'snapshots')
+    if not os.path.isdir(snapshots_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(snapshots_dir)
+        if os.path.exists(os.path.join(snapshots_dir, name, MANIFEST_NAME))
+    )
+
+
+def load_manifest(backup_root, snapshot_id):
+    with open(os.path.join(backup_root, 'snapshots', snapshot_id, MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def scan_upload_tree(upload_root, previous_files=None):
+    """Build the file manifest, re-hashing only files whose size or mtime changed"""
+    previous_files = previous_files or {}
+    files = {}
+    for dirpath, _, filenames in os.walk(upload_root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            rel_path = os.path.relpath(path, upload_root).replace(os.sep, '/')
+            stat = os.stat(path)
+            previous = previous_files.get(rel_path)
+            if previous and previous['size'] == stat.st_size and previous['mtime'] == stat.st_mtime:
+                file_hash = previous['hash']
+            else:
+                file_hash = file_sha256(path)
+            files[rel_path] = {'hash': file_hash, 'size': stat.st_size, 'mtime': stat.st_mtime}
+    return files
+
+
+def create_snapshot(database_path, upload_root, backup_root, workers=4):
+    """Take an incremental snapshot of the database and upload tree"""
+    snapshot_id = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+    snapshot_dir = os.path.join(backup_root, 'snapshots', snapshot_id)
+    os.makedirs(snapshot_dir)
+
+    # Database: online copy to a temp file, then compress into the snapshot
+    fd, tmp_db = tempfile.mkstemp(suffix='.db', dir=backup_root)
+    os.close(fd)
+    try:
+        backup_database(database_path, tmp_db)
+        _compress_file(tmp_db, os.path.join(snapshot_dir, DATABASE_OBJECT))
+    finally:
+        os.remove(tmp_db)
+
+    # Upload tree: only new content gets stored
+    existing = list_snapshots(backup_root)
+    previous = load_manifest(backup_root, existing[-1])['files'] if existing else {}
+    files = scan_upload_tree(upload_root, previous) if os.path.isdir(upload_root) else {}
+
+    to_store = {}
+    for rel_path, entry in files.items():
+        object_path = _object_path(backup_root, entry['hash'])
+        if entry['hash'] not in to_store and not os.path.exists(object_path):
+            to_store[entry['hash']] = (os.path.join(upload_root, rel_path), object_path)
+
+    def store(item):
+        source_path, object_path = item
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        _compress_file(source_path, object_path)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(store, to_store.values()))
+
+    manifest = {
+        'snapshot_id': snapshot_id,
+        'created_at': datetime.now().isoformat(),
+        'database': DATABASE_OBJECT,
+        'files': files,
+        'new_objects': len(to_store),
+    }
+    # Written last: a snapshot without a manifest is incomplete and ignored
+    with open(os.path.join(snapshot_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"✅ Snapshot {snapshot_id}: {len(files)} files, {len(to_store)} new objects stored")
+    return manifest
+
+
+def export_archive(backup_root, snapshot_id, archive_path):
+    """Write one snapshot as a self-contained .tar.gz"""
+    manifest = load_manifest(backup_root, snapshot_id)
+    snapshot_dir = os.path.join(backup_root, 'snapshots', snapshot_id)
+    with tarfile.open(archive_path, 'w:gz') as archive:
+        archive.add(os.path.join(snapshot_dir, MANIFEST_NAME), arcname=MANIFEST_NAME)
+        fd, tmp_db = tempfile.mkstemp(suffix='.db', dir=backup_root)
+        os.close(fd)
+        try:
+            _decompress_file(os.path.join(snapshot_dir, DATABASE_OBJECT), tmp_db)
+            archive.add(tmp_db, arcname='database.db')
+        finally:
+            os.remove(tmp_db)
+        for rel_path, entry in manifest['files'].items():
+            with gzip.open(_object_path(backup_root, entry['hash']), 'rb') as source:
+                info = tarfile.TarInfo(f"uploads/{rel_path}")
+                info.size = entry['size']
+                info.mtime = entry['mtime']
+                archive.addfile(info, source)
+    print(f"✅ Archive written: {archive_path}")
+    return archive_path
+
+
+def restore_snapshot(backup_root, database_path, upload_root, snapshot_id=None, workers=8):
+    """Restore the database and upload tree from a snapshot (latest by default)"""
+    snapshots = list_snapshots(backup_root)
+    if not snapshots:
+        raise FileNotFoundError(f"No snapshots found in {backup_root}")
+    snapshot_id = snapshot_id or snapshots[-1]
+    manifest = load_manifest(backup_root, snapshot_id)
+    snapshot_dir = os.path.join(backup_root, 'snapshots', snapshot_id)
+
+    db_dir = os.path.dirname(os.path.abspath(database_path))
+    os.makedirs(db_dir, exist_ok=True)
+    # A WAL file left by the old database would be replayed into the restored one
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(database_path + suffix):
+            os.remove(database_path + suffix)
+    _decompress_file(os.path.join(snapshot_dir, manifest['database']), database_path)
+
+    upload_root_abs = os.path.abspath(upload_root)
+
+    def restore_file(item):
+        rel_path, entry = item
+        target = os.path.abspath(os.path.join(upload_root, rel_path))
+        if not target.startswith(upload_root_abs + os.sep):
+            raise ValueError(f"Refusing to restore outside the upload folder: {rel_path}")
+        # Files already in place are left alone, so repeat restores are cheap
+        if os.path.exists(target) and os.path.getsize(target) == entry['size'] \
+                and file_sha256(target) == entry['hash']:
+            return False
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        _decompress_file(_object_path(backup_root, entry['hash']), target)
+        os.utime(target, (entry['mtime'], entry['mtime']))
+        return True
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        restored = sum(pool.map(restore_file, manifest['files'].items()))
+
+    print(f"✅ Restored snapshot {snapshot_id}: database + {restored} files")
+    return manifest
+
+
+def main(argv=None):
+    """Command line entry point: python backup.py snapshot|restore|list"""
+    parser = argparse.ArgumentParser(description='Back up and restore the loan database and uploads')
+    parser.add_argument('--database', default=DATABASE_PATH)
+    parser.add_argument('--upload-folder', default=UPLOAD_FOLDER)
+    parser.add_argument('--backup-folder', default=BACKUP_FOLDER)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    snapshot_cmd = commands.add_parser('snapshot', help='Take an incremental snapshot')
+    snapshot_cmd.add_argument('--archive', help='Also write the snapshot as a .tar.gz')
+
+    restore_cmd = commands.add_parser('restore', help='Restore a snapshot')
+    restore_cmd.add_argument('snapshot_id', nargs='?', help='Snapshot to restore (default: latest)')
+    restore_cmd.add_argument('--if-missing', action='store_true',
+                             help='Only restore when the database file does not exist')
+
+    commands.add_parser('list', help='List snapshots')
+    args = parser.parse_args(argv)
+
+    if args.command == 'snapshot':
+        os.makedirs(args.backup_folder, exist_ok=True)
+        manifest = create_snapshot(args.database, args.upload_folder, args.backup_folder)
+        if args.archive:
+            export_archive(args.backup_folder, manifest['snapshot_id'], args.archive)
+    elif args.command == 'restore':
+        if args.if_missing and os.path.exists(args.database):
+            print(f"ℹ️ {args.database} exists - skipping restore")
+            return
+        restore_snapshot(args.backup_folder, args.database, args.upload_folder, args.snapshot_id)
+    else:
+        for snapshot_id in list_snapshots(args.backup_folder):
+            manifest = load_manifest(args.backup_folder, snapshot_id)
+            print(f"{snapshot_id}  {len(manifest['files'])} files  {manifest['new_objects']} new objects")
+
+
+if __name__ == '__main__':
+    main()
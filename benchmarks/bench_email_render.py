@@ -0,0 +1,57 @@
+"""Benchmark notification email rendering.
+
+Run from the repository root: python benchmarks/bench_email_render.py [count]
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+with contextlib.redirect_stdout(io.StringIO()):
+    from email_service import email_service, create_template_environment, EMAIL_TEMPLATES
+
+SAMPLE_DATA = {
+    'name': 'Test User', 'dob': '1990-01-01', 'phone': '9876543210', 'alt_phone': '',
+    'email': 'test@example.com', 'mother_name': 'Parent', 'qualification': 'B.Tech',
+    'present_address': '1 Main Road', 'present_years': 3.0,
+    'permanent_address': '1 Main Road', 'permanent_years': 10.0,
+    'total_experience': 6.0, 'company_experience': 2.0, 'company_name': 'Test Company',
+    'company_address': '2 Tech Park', 'landmark': '', 'designation': 'Engineer',
+    'office_contact': '0401234567', 'official_email': 'test@company.example',
+    'bank_name': 'Test Bank', 'bank_years': 5.0, 'branch': 'Central',
+    'loan_amount': 500000.0, 'tenure': 36, 'existing_loan': '',
+    'friend_name': 'Friend', 'friend_contact': '9000000001', 'friend_address': '3 Side Street',
+    'relative_name': 'Relative', 'relative_contact': '9000000002', 'relative_address': '4 Cross Road',
+}
+
+SAMPLE_FILES = [
+    {'file_type': 'PAN Card', 'password': 'No password', 'original_filename': 'pan.pdf'},
+    {'file_type': 'Bank Statement', 'password': 'secret', 'original_filename': 'statement.pdf'},
+]
+
+
+def timed(label, count, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed * 1000:9.1f} ms  {count / elapsed:10.0f} ops/s")
+
+
+def main(count=2000):
+    timed('load + compile templates (cold env)', len(EMAIL_TEMPLATES) * 2, lambda: [
+        create_template_environment().get_template(f'{name}.{ext}')
+        for name in EMAIL_TEMPLATES for ext in ('txt', 'html')
+    ])
+    timed(f'render one at a time x{count}', count, lambda: [
+        email_service._create_email_body(i, SAMPLE_DATA, SAMPLE_FILES) for i in range(count)
+    ])
+    imported = [{'application_id': i, 'name': 'Test User', 'loan_amount': 500000.0, 'files_uploaded': 2}
+                for i in range(count)]
+    timed(f'bulk import summary ({count} rows)', 1, lambda: email_service._create_bulk_email_body(imported))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,132 @@
+"""Compare the sync and async server modes under slow concurrent uploads.
+
+Starts gunicorn once per mode in a scratch directory. Clients then arrive at
+a steady rate, and each one trickles a multipart /apply upload over a few
+seconds, the way slow mobile clients do. Uploads are larger than the socket
+buffers and paced much slower than the server processes them, so a sync
+worker stays pinned to a connection for most of its upload. Reports wall
+time, request latency and status codes.
+
+Run from the repository root:
+python benchmarks/bench_server_modes.py [clients] [upload_kb] [arrivals_per_second]
+"""
+import asyncio
+import collections
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_email_render import SAMPLE_DATA
+
+# Pieces each upload is split into, and the pause between them (2 s per upload)
+UPLOAD_PIECES = 20
+PIECE_DELAY = 0.1
+
+WORKERS = 2
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def multipart_body(upload_kb):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for field, value in SAMPLE_DATA.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="pan"; filename="pan.pdf"\r\n'
+                 f'Content-Type: application/pdf\r\n\r\n'.encode())
+    parts.append(b'%PDF-1.4\n' + b'0' * (upload_kb * 1024) + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return boundary, b''.join(parts)
+
+
+async def slow_upload(port, boundary, body, start_delay=0.0):
+    """Send one paced upload after start_delay. Returns (status, seconds)."""
+    await asyncio.sleep(start_delay)
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    # A small send buffer keeps the pacing visible to the server
+    writer.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 16 * 1024)
+    head = (f'POST /apply HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n'
+            f'Content-Type: multipart/form-data; boundary={boundary}\r\n'
+            f'Content-Length: {len(body)}\r\n\r\n').encode()
+    writer.write(head)
+    piece = -(-len(body) // UPLOAD_PIECES)
+    for offset in range(0, len(body), piece):
+        writer.write(body[offset:offset + piece])
+        await writer.drain()
+        await asyncio.sleep(PIECE_DELAY)
+    status_line = await reader.readline()
+    await reader.read()
+    writer.close()
+    return int(status_line.split()[1]), time.perf_counter() - started
+
+
+async def run_clients(port, clients, upload_kb, rate):
+    boundary, body = multipart_body(upload_kb)
+    results = await asyncio.gather(*(slow_upload(port, boundary, body, i / rate) for i in range(clients)),
+                                   return_exceptions=True)
+    statuses = collections.Counter(r[0] if isinstance(r, tuple) else type(r).__name__ for r in results)
+    latencies = sorted(r[1] for r in results if isinstance(r, tuple))
+    return statuses, latencies
+
+
+def wait_for_server(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def bench_mode(mode, clients, upload_kb, rate):
+    workdir = tempfile.mkdtemp(prefix=f'bench-{mode}-')
+    port = free_port()
+    env = dict(os.environ, SERVER_MODE=mode, PYTHONPATH=ROOT, RATE_LIMIT_APPLY='100000/1',
+               EMAIL_PASSWORD='your_app_password', WEB_CONCURRENCY=str(WORKERS))
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+         '--chdir', workdir, '--bind', f'127.0.0.1:{port}'],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_for_server(port)
+        start = time.perf_counter()
+        statuses, latencies = asyncio.run(run_clients(port, clients, upload_kb, rate))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+    p50 = statistics.median(latencies) if latencies else 0
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+    print(f"{mode:<6} {elapsed:7.2f} s wall  p50 {p50:6.2f} s  p95 {p95:6.2f} s  {dict(statuses)}")
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    upload_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+    print(f"{clients} clients arriving at {rate:g}/s, {upload_kb} KB each over "
+          f"{UPLOAD_PIECES * PIECE_DELAY:g} s, {WORKERS} workers")
+    for mode in ('sync', 'async'):
+        bench_mode(mode, clients, upload_kb, rate)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+import argparse
+import contextlib
+import csv
+import json
+import os
+import shutil
+import sys
+import tempfile
+import zipfile
+
+from werkzeug.utils import secure_filename
+
+from async_services import send_bulk_notification_in_background
+from config import DATABASE_PATH, UPLOAD_FOLDER
+from storage import user_folder_path, file_sha256
+from validation import FILE_TYPES, allowed_file, validate_application_data, extract_file_passwords
+
+IMPORT_FORMATS = ('ndjson', 'csv')
+
+# Rows inserted per executemany transaction
+BULK_CHUNK_SIZE = 1000
+
+# Same per-document limit as the /apply form
+MAX_DOCUMENT_SIZE = 10 * 1024 * 1024
+
+
+def detect_format(filename=None, content_type=None):
+    """Guess the batch format from a filename or content type"""
+    name = (filename or '').lower()
+    ctype = (content_type or '').lower()
+    if name.endswith('.csv') or 'csv' in ctype:
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in ctype or 'jsonl' in ctype:
+        return 'ndjson'
+    return None
+
+
+def iter_records(stream, fmt):
+    """Yield (record, error) pairs from a binary stream of NDJSON or CSV.
+
+    Lines are decoded one at a time so a large batch is never held in memory.
+    """
+    lines = (line.decode('utf-8-sig') for line in stream)
+    if fmt == 'csv':
+        for record in csv.DictReader(lines):
+            yield record, None
+    elif fmt == 'ndjson':
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield None, 'Each line must be a JSON object'
+                continue
+            yield record, None
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+def index_documents(archive):
+    """Map (reference, file field) to zip entries named <reference>/<field>.pdf"""
+    documents = {}
+    for info in archive.infolist():
+        if info.is_dir():
+            continue
+        parts = info.filename.replace('\\', '/').strip('/').split('/')
+        if len(parts) < 2 or not allowed_file(parts[-1]):
+            continue
+        field = parts[-1].rsplit('.', 1)[0].lower()
+        if field in FILE_TYPES:
+            documents[(parts[-2], field)] = info
+    return documents
+
+
+def _extract_document(archive, info, destination):
+    """Copy one zip entry to disk, refusing entries over the size limit"""
+    if info.file_size > MAX_DOCUMENT_SIZE:
+        raise ValueError(f"{info.filename} is larger than {MAX_DOCUMENT_SIZE} bytes")
+    with archive.open(info) as source, open(destination, 'wb') as target:
+        shutil.copyfileobj(source, target, 64 * 1024)
+
+
+class BulkImporter:
+    """Validates partner batches and inserts them in large transactions"""
+
+    def __init__(self, database, upload_root, documents=None, chunk_size=BULK_CHUNK_SIZE):
+        self.database = database
+        self.upload_root = upload_root
+        self.chunk_size = chunk_size
+        self.archive = zipfile.ZipFile(documents) if documents is not None else None
+        self.documents = index_documents(self.archive) if self.archive else {}
+        self.results = []
+        self.imported = []
+
+    def run(self, records):
+        """Import every record and return per-row results"""
+        pending = []
+        for row_number, (record, error) in enumerate(records, start=1):
+            reference = str((record or {}).get('reference') or row_number)
+            if error is None:
+                form_data, error = validate_application_data(record)
+            if error:
+                self.results.append({'row': row_number, 'reference': reference,
+                                     'success': False, 'error': error})
+                continue
+            pending.append((row_number, reference, form_data, extract_file_passwords(record)))
+            if len(pending) >= self.chunk_size:
+                self._flush(pending)
+                pending = []
+        if pending:
+            self._flush(pending)
+        if self.archive:
+            self.archive.close()
+        return self.results
+
+    def _flush(self, pending):
+        # Documents are extracted and hashed before the insert so the write lock
+        # is held only for the inserts; they are moved into place after COMMIT
+        staging = tempfile.mkdtemp(prefix='.import-', dir=self.upload_root)
+        try:
+            staged = [self._stage_documents(os.path.join(staging, str(row_number)), reference, passwords)
+                      for row_number, reference, _, passwords in pending]
+            moves = []
+
+            def file_records(application_ids):
+                # Runs inside the insert transaction, once the application IDs are known
+                records = []
+                for (_, _, form_data, _), application_id, documents in zip(pending, application_ids, staged):
+                    user_folder = user_folder_path(self.upload_root, form_data['name'], application_id)
+                    for staged_path, file_type, password, file_size, file_hash in documents:
+                        file_path = os.path.join(user_folder, os.path.basename(staged_path))
+                        records.append((application_id, file_type, file_path, password, file_size, file_hash))
+                        moves.append((staged_path, file_path))
+                return records
+
+            try:
+                application_ids = self.database.save_applications_bulk([item[2] for item in pending], file_records)
+            except Exception as e:
+                print(f"❌ Bulk insert failed for {len(pending)} rows: {e}")
+                for row_number, reference, _, _ in pending:
+                    self.results.append({'row': row_number, 'reference': reference,
+                                         'success': False, 'error': 'Database insert failed'})
+                return
+
+            for staged_path, file_path in moves:
+                try:
+                    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                    os.replace(staged_path, file_path)
+                except OSError as e:
+                    print(f"❌ Could not move imported document to {file_path}: {e}")
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        for (row_number, reference, form_data, _), application_id, documents in zip(pending, application_ids, staged):
+            self.results.append({'row': row_number, 'reference': reference, 'success': True,
+                                 'application_id': application_id, 'files_uploaded': len(documents)})
+            self.imported.append({'application_id': application_id, 'name': form_data['name'],
+                                  'loan_amount': form_data['loan_amount'], 'files_uploaded': len(documents)})
+        print(f"✅ Bulk imported {len(application_ids)} applications")
+
+    def _stage_documents(self, folder, reference, passwords):
+        """Extract a row's documents into a staging folder.
+
+        Returns (staged_path, file_type, password, file_size, file_hash) tuples.
+        """
+        documents = []
+        for field, file_type in FILE_TYPES.items():
+            info = self.documents.get((reference, field))
+            if info is None:
+                continue
+            os.makedirs(folder, exist_ok=True)
+            staged_path = os.path.join(folder, secure_filename(os.path.basename(info.filename)))
+            try:
+                _extract_document(self.archive, info, staged_path)
+            except Exception as e:
+                print(f"⚠️ Error extracting {info.filename}: {e}")
+                continue
+            documents.append((staged_path, file_type, passwords[field],
+                              os.path.getsize(staged_path), file_sha256(staged_path)))
+        return documents
+
+    def summary(self):
+        succeeded = sum(1 for result in self.results if result['success'])
+        return {
+            'total_rows': len(self.results),
+            'imported': succeeded,
+            'failed': len(self.results) - succeeded,
+            'results': sorted(self.results, key=lambda result: result['row']),
+        }
+
+
+def enqueue_notification(email_service, imported):
+    """Send one summary email for the whole batch off the request path.
+
+    Returns the Future from the shared email executor, or None if there is
+    nothing to send.
+    """
+    if not imported or not email_service.is_configured():
+        return None
+    return send_bulk_notification_in_background(email_service, imported)
+
+
+def main(argv=None):
+    """Command line entry point: python bulk_import.py batch.ndjson --documents docs.zip"""
+    parser = argparse.ArgumentParser(description='Bulk import loan applications')
+    parser.add_argument('batch', help='NDJSON or CSV file of applications')
+    parser.add_argument('--format', choices=IMPORT_FORMATS, help='Batch format (default: from file extension)')
+    parser.add_argument('--documents', help='Zip of documents named <reference>/<field>.pdf')
+    parser.add_argument('--database', default=DATABASE_PATH)
+    parser.add_argument('--upload-folder', default=UPLOAD_FOLDER)
+    parser.add_argument('--chunk-size', type=int, default=BULK_CHUNK_SIZE)
+    parser.add_argument('--no-email', action='store_true', help='Skip the batch notification email')
+    args = parser.parse_args(argv)
+
+    fmt = args.format or detect_format(args.batch)
+    if fmt is None:
+        parser.error('Cannot tell batch format from the file name; pass --format')
+
+    # Keep startup and progress logging out of the JSON summary on stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        from database import LoanDatabase
+        database = LoanDatabase(args.database)
+        os.makedirs(args.upload_folder, exist_ok=True)
+
+        with open(args.batch, 'rb') as stream:
+            importer = BulkImporter(database, args.upload_folder, args.documents, args.chunk_size)
+            importer.run(iter_records(stream, fmt))
+
+        if not args.no_email:
+            from email_service import email_service
+            future = enqueue_notification(email_service, importer.imported)
+            if future:
+                future.result()
+
+    json.dump(importer.summary(), sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask import request, make_response
+
+# Upper bound on rendered HTML kept in memory per worker
+FRAGMENT_CACHE_BYTES = int(os.environ.get('FRAGMENT_CACHE_BYTES', 16 * 1024 * 1024))
+
+
+class LRUCache:
+    """Thread-safe LRU cache of rendered strings, bounded by total size.
+
+    Keys are tuples whose first item names the kind of fragment, e.g.
+    ('application', 42, version), so related entries can be invalidated together.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = value
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def get_or_render(self, key, render):
+        value = self.get(key)
+        if value is None:
+            value = render()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, kind, item_id=None):
+        """Drop every entry of a kind, or only those for one item"""
+        with self._lock:
+            stale = [
+                key for key in self._entries
+                if key[0] == kind and (item_id is None or key[1] == item_id)
+            ]
+            for key in stale:
+                self._size -= len(self._entries.pop(key))
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+def make_etag(*parts):
+    """Strong ETag from the values that identify a version of a resource"""
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def parse_db_timestamp(value):
+    """SQLite CURRENT_TIMESTAMP strings are UTC 'YYYY-MM-DD HH:MM:SS'"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value[:19], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def conditional_response(etag, last_modified, render):
+    """Return 304 when the client's copy is current, otherwise call render().
+
+    The check happens before render() so a revalidation costs one small query.
+    """
+    not_modified = False
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    elif last_modified and request.if_modified_since:
+        not_modified = last_modified <= request.if_modified_since
+
+    response = make_response('' if not_modified else render(), 304 if not_modified else 200)
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # Browsers keep the page but must revalidate before reusing it
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+# Create global fragment cache instance
+fragment_cache = LRUCache(FRAGMENT_CACHE_BYTES)
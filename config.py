@@ -0,0 +1,64 @@
+import os
+import tempfile
+
+# Configuration for Render.com
+if os.environ.get('RENDER'):
+    # Production configuration for Render
+    UPLOAD_FOLDER = os.path.join(tempfile.gettempdir(), 'loan_uploads')
+    DATABASE_PATH = os.path.join(tempfile.gettempdir(), 'loan_applications.db')
+    RATE_LIMIT_DB_PATH = os.path.join(tempfile.gettempdir(), 'loan_rate_limits.db')
+else:
+    # Local development configuration
+    UPLOAD_FOLDER = 'uploads'
+    DATABASE_PATH = 'loan_applications.db'
+    RATE_LIMIT_DB_PATH = 'rate_limits.db'
+
+# Snapshots of the database and upload tree (see backup.py)
+BACKUP_FOLDER = os.environ.get('BACKUP_FOLDER', 'backups')
+
+# Retention policy (see retention.py)
+COLD_STORAGE_FOLDER = os.environ.get('COLD_STORAGE_FOLDER', os.path.join(BACKUP_FOLDER, 'cold'))
+RETENTION_ARCHIVE_DAYS = int(os.environ.get('RETENTION_ARCHIVE_DAYS', 180))
+RETENTION_CLOSED_DAYS = int(os.environ.get('RETENTION_CLOSED_DAYS', 30))
+RETENTION_PURGE_DAYS = int(os.environ.get('RETENTION_PURGE_DAYS', 7 * 365))
+
+# How long /apply retries with the same idempotency key are replayed
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+# A key with no stored response older than this belongs to a request that died
+# (e.g. a worker killed by gunicorn's timeout); keep it >= the worker timeout
+IDEMPOTENCY_PROCESSING_TIMEOUT = int(os.environ.get('IDEMPOTENCY_PROCESSING_TIMEOUT',
+                                                    os.environ.get('GUNICORN_TIMEOUT', 120)))
+
+# Partner batches with a zip of documents are far larger than a single application
+BULK_IMPORT_MAX_BYTES = int(os.environ.get('BULK_IMPORT_MAX_MB', 200)) * 1024 * 1024
+
+# Per-client rate limits as 'requests/seconds' (see rate_limit.py)
+RATE_LIMITS = {
+    'apply_loan': os.environ.get('RATE_LIMIT_APPLY', '5/60'),
+    'bulk_import': os.environ.get('RATE_LIMIT_BULK_IMPORT', '10/60'),
+    'test_email': os.environ.get('RATE_LIMIT_TEST_EMAIL', '3/3600'),
+}
+
+# Admission control: shed /apply and /test-email load when the workers are saturated
+ADMISSION_CONTROL = os.environ.get('ADMISSION_CONTROL', '').lower() in ('1', 'true', 'yes')
+ADMISSION_MAX_IN_FLIGHT = int(os.environ.get('ADMISSION_MAX_IN_FLIGHT', 8))
+ADMISSION_LATENCY_THRESHOLD = float(os.environ.get('ADMISSION_LATENCY_THRESHOLD', 5.0))
+# Slots held longer than a request can live belong to a killed worker
+ADMISSION_SLOT_TIMEOUT = float(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+# Serving mode: 'sync' runs app:app on gunicorn sync workers, 'async' runs
+# asgi:application on uvicorn workers (see gunicorn.conf.py and asgi.py)
+SERVER_MODE = os.environ.get('SERVER_MODE', 'sync').lower()
+
+# Seconds a connection waits for SQLite's write lock. SQLite's busy handler is
+# not first-come-first-served, so with many app threads a short wait can fail
+DATABASE_BUSY_TIMEOUT = float(os.environ.get('DATABASE_BUSY_TIMEOUT', 30))
+
+# Threads that run Flask views in async mode, and executors for blocking calls
+ASYNC_APP_THREADS = int(os.environ.get('ASYNC_APP_THREADS', 16))
+DB_EXECUTOR_THREADS = int(os.environ.get('DB_EXECUTOR_THREADS', 4))
+EMAIL_EXECUTOR_THREADS = int(os.environ.get('EMAIL_EXECUTOR_THREADS', 2))
+
+# 'inline' sends the /apply email before responding; 'background' queues it
+EMAIL_DELIVERY = os.environ.get('EMAIL_DELIVERY', 'background' if SERVER_MODE == 'async' else 'inline').lower()
@@ -1,7 +1,42 @@
 import sqlite3
 import os
+import json
 from datetime import datetime
 
+from config import DATABASE_BUSY_TIMEOUT
+from migrations import run_migrations, build_indexes, missing_indexes, find_full_scans, get_schema_version
+
+APPLICATION_COLUMNS = [
+    'name', 'dob', 'phone', 'mother_name', 'qualification', 'alt_phone', 'email',
+    'present_address', 'present_years', 'permanent_address', 'permanent_years',
+    'total_experience', 'company_experience', 'company_name', 'company_address',
+    'landmark', 'designation', 'office_contact', 'official_email', 'bank_name',
+    'bank_years', 'branch', 'loan_amount', 'tenure', 'existing_loan', 'friend_name',
+    'friend_contact', 'friend_address', 'relative_name', 'relative_contact', 'relative_address'
+]
+
+# Columns that may be missing from the submitted data
+OPTIONAL_APPLICATION_COLUMNS = {'alt_phone', 'landmark', 'existing_loan'}
+
+INSERT_APPLICATION_SQL = f'''
+    INSERT INTO applications ({', '.join(APPLICATION_COLUMNS)})
+    VALUES ({', '.join('?' for _ in APPLICATION_COLUMNS)})
+'''
+
+INSERT_FILE_SQL = '''
+    INSERT INTO file_uploads (application_id, file_type, file_path, file_password, file_size, file_hash)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+
+def application_values(data):
+    """Parameter tuple for INSERT_APPLICATION_SQL"""
+    return tuple(
+        data.get(column, '') if column in OPTIONAL_APPLICATION_COLUMNS else data[column]
+        for column in APPLICATION_COLUMNS
+    )
+
+
 class LoanDatabase:
     def __init__(self, db_name='loan_applications.db'):
         self.db_name = db_name
@@ -9,124 +44,185 @@ class LoanDatabase:
     
     def get_connection(self):
         """Create and return database connection"""
-        conn = sqlite3.connect(self.db_name)
+        conn = sqlite3.connect(self.db_name, timeout=DATABASE_BUSY_TIMEOUT)
         conn.row_factory = sqlite3.Row
         return conn
     
     def init_db(self):
-        """Initialize database with tables"""
+        """Initialize database by applying pending schema migrations"""
         try:
             conn = self.get_connection()
-            cursor = conn.cursor()
             
-            # Create applications table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS applications (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    dob TEXT NOT NULL,
-                    phone TEXT NOT NULL,
-                    mother_name TEXT NOT NULL,
-                    qualification TEXT NOT NULL,
-                    alt_phone TEXT,
-                    email TEXT NOT NULL,
-                    present_address TEXT NOT NULL,
-                    present_years REAL NOT NULL,
-                    permanent_address TEXT NOT NULL,
-                    permanent_years REAL NOT NULL,
-                    total_experience REAL NOT NULL,
-                    company_experience REAL NOT NULL,
-                    company_name TEXT NOT NULL,
-                    company_address TEXT NOT NULL,
-                    landmark TEXT,
-                    designation TEXT NOT NULL,
-                    office_contact TEXT NOT NULL,
-                    official_email TEXT NOT NULL,
-                    bank_name TEXT NOT NULL,
-                    bank_years REAL NOT NULL,
-                    branch TEXT NOT NULL,
-                    loan_amount REAL NOT NULL,
-                    tenure INTEGER NOT NULL,
-                    existing_loan TEXT,
-                    friend_name TEXT NOT NULL,
-                    friend_contact TEXT NOT NULL,
-                    friend_address TEXT NOT NULL,
-                    relative_name TEXT NOT NULL,
-                    relative_contact TEXT NOT NULL,
-                    relative_address TEXT NOT NULL,
-                    submission_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Create file_uploads table with password field
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS file_uploads (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    application_id INTEGER,
-                    file_type TEXT NOT NULL,
-                    file_path TEXT NOT NULL,
-                    file_password TEXT NOT NULL,
-                    upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (application_id) REFERENCES applications (id)
-                )
-            ''')
+            # WAL lets readers carry on while a request thread writes; the mode is stored in the file
+            conn.execute('PRAGMA journal_mode=WAL')
             
-            conn.commit()
+            applied = run_migrations(conn)
+            build_indexes(conn)
+            
+            for warning in find_full_scans(conn):
+                print(f"⚠️ Query plan warning: {warning}")
+            
+            version = get_schema_version(conn)
             conn.close()
-            print("✅ Database initialized successfully!")
+            print(f"✅ Database initialized successfully! (schema v{version}, {len(applied)} migrations applied)")
             
         except Exception as e:
             print(f"❌ Database initialization error: {e}")
     
-    def save_application(self, data):
-        """Save loan application to database"""
+    def get_schema_version(self):
+        """Get the current schema version"""
+        try:
+            conn = self.get_connection()
+            version = get_schema_version(conn)
+            conn.close()
+            return version
+        except Exception as e:
+            print(f"❌ Error reading schema version: {e}")
+            return 0
+    
+    def check_indexes(self):
+        """Return expected indexes that are missing"""
+        try:
+            conn = self.get_connection()
+            missing = missing_indexes(conn)
+            conn.close()
+            return missing
+        except Exception as e:
+            print(f"❌ Error checking indexes: {e}")
+            return []
+    
+    def check_query_plans(self):
+        """Return warnings for hot queries that do full table scans"""
+        try:
+            conn = self.get_connection()
+            warnings = find_full_scans(conn)
+            conn.close()
+            return warnings
+        except Exception as e:
+            print(f"❌ Error checking query plans: {e}")
+            return []
+    
+    def save_application(self, data, idempotency_key=None, request_hash=None):
+        """Save loan application to database.
+        
+        With an idempotency key, the key is recorded in the same transaction, so
+        a retry can never create a second application. Returns None if the key
+        is already taken.
+        """
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
             
-            cursor.execute('''
-                INSERT INTO applications (
-                    name, dob, phone, mother_name, qualification, alt_phone, email,
-                    present_address, present_years, permanent_address, permanent_years,
-                    total_experience, company_experience, company_name, company_address,
-                    landmark, designation, office_contact, official_email, bank_name,
-                    bank_years, branch, loan_amount, tenure, existing_loan, friend_name,
-                    friend_contact, friend_address, relative_name, relative_contact, relative_address
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                data['name'], data['dob'], data['phone'], data['mother_name'],
-                data['qualification'], data.get('alt_phone', ''), data['email'],
-                data['present_address'], data['present_years'], data['permanent_address'],
-                data['permanent_years'], data['total_experience'], data['company_experience'],
-                data['company_name'], data['company_address'], data.get('landmark', ''),
-                data['designation'], data['office_contact'], data['official_email'],
-                data['bank_name'], data['bank_years'], data['branch'], data['loan_amount'],
-                data['tenure'], data.get('existing_loan', ''), data['friend_name'],
-                data['friend_contact'], data['friend_address'], data['relative_name'],
-                data['relative_contact'], data['relative_address']
-            ))
-            
+            cursor.execute(INSERT_APPLICATION_SQL, application_values(data))
             application_id = cursor.lastrowid
+            
+            if idempotency_key:
+                cursor.execute('''
+                    INSERT INTO idempotency_keys (idempotency_key, request_hash, application_id)
+                    VALUES (?, ?, ?)
+                ''', (idempotency_key, request_hash, application_id))
+            
             conn.commit()
             conn.close()
             
             print(f"✅ Application saved with ID: {application_id}")
             return application_id
             
+        except sqlite3.IntegrityError as e:
+            conn.rollback()
+            conn.close()
+            if 'idempotency_keys' in str(e):
+                print(f"⚠️ Idempotency key already used: {idempotency_key}")
+            else:
+                print(f"❌ Error saving application: {e}")
+            return None
         except Exception as e:
             print(f"❌ Error saving application: {e}")
             return None
     
-    def save_file_record(self, application_id, file_type, file_path, file_password):
+    def get_idempotency_record(self, idempotency_key):
+        """Get the stored request hash and response for an idempotency key"""
+        try:
+            conn = self.get_connection()
+            row = conn.execute('''
+                SELECT * FROM idempotency_keys WHERE idempotency_key = ?
+            ''', (idempotency_key,)).fetchone()
+            conn.close()
+            return row
+        except Exception as e:
+            print(f"❌ Error getting idempotency key: {e}")
+            return None
+    
+    def save_idempotent_response(self, idempotency_key, status_code, response_body):
+        """Store the final response so retries can replay it"""
+        try:
+            conn = self.get_connection()
+            conn.execute('''
+                UPDATE idempotency_keys SET status_code = ?, response_body = ?
+                WHERE idempotency_key = ?
+            ''', (status_code, response_body, idempotency_key))
+            conn.commit()
+            conn.close()
+            return True
+        except Exception as e:
+            print(f"❌ Error saving idempotent response: {e}")
+            return False
+    
+    def purge_idempotency_keys(self, older_than_hours):
+        """Delete idempotency keys past their replay window"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.execute('''
+                DELETE FROM idempotency_keys WHERE created_at < datetime('now', ?)
+            ''', (f'-{older_than_hours} hours',))
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            conn.close()
+    
+    def save_applications_bulk(self, rows, file_records=None):
+        """Insert many applications in one transaction and return their IDs in order.
+        
+        `file_records`, if given, is called with the new IDs inside the same
+        transaction and returns file_uploads rows (see INSERT_FILE_SQL) to insert
+        with them, so a batch and its documents commit or fail together.
+        """
+        conn = self.get_connection()
+        try:
+            # Take the write lock up front so the AUTOINCREMENT range is ours alone
+            conn.isolation_level = None
+            conn.execute('BEGIN IMMEDIATE')
+            before = self._last_application_id(conn)
+            conn.executemany(INSERT_APPLICATION_SQL, (application_values(row) for row in rows))
+            after = self._last_application_id(conn)
+            if after - before != len(rows):
+                raise RuntimeError(f"Expected {len(rows)} new application IDs, got {after - before}")
+            application_ids = list(range(before + 1, after + 1))
+            if file_records:
+                conn.executemany(INSERT_FILE_SQL, file_records(application_ids))
+            conn.execute('COMMIT')
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+        return application_ids
+    
+    def _last_application_id(self, conn):
+        row = conn.execute('''
+            SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'applications'), 0),
+                       COALESCE((SELECT MAX(id) FROM applications), 0))
+        ''').fetchone()
+        return row[0]
+    
+    def save_file_record(self, application_id, file_type, file_path, file_password, file_size=None, file_hash=None):
         """Save file upload record to database with password"""
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
             
-            cursor.execute('''
-                INSERT INTO file_uploads (application_id, file_type, file_path, file_password)
-                VALUES (?, ?, ?, ?)
-            ''', (application_id, file_type, file_path, file_password))
+            cursor.execute(INSERT_FILE_SQL, (application_id, file_type, file_path, file_password, file_size, file_hash))
             
             conn.commit()
             conn.close()
@@ -168,6 +264,38 @@ class LoanDatabase:
             print(f"❌ Error getting applications: {e}")
             return []
     
+    def get_applications_version(self):
+        """Cheap fingerprint of the applications table: (count, max id, latest submission)"""
+        try:
+            conn = self.get_connection()
+            row = conn.execute('''
+                SELECT COUNT(*), MAX(id), MAX(submission_date) FROM applications
+            ''').fetchone()
+            conn.close()
+            return tuple(row)
+        except Exception as e:
+            print(f"❌ Error getting applications version: {e}")
+            return None
+    
+    def get_application_version(self, application_id):
+        """Fingerprint of one application and its files, or None if it does not exist"""
+        try:
+            conn = self.get_connection()
+            row = conn.execute('''
+                SELECT a.id, a.submission_date, a.status, a.score,
+                       COUNT(f.id), MAX(f.id), MAX(f.upload_date),
+                       (SELECT MAX(inspected_at) FROM document_inspections WHERE application_id = a.id)
+                FROM applications a
+                LEFT JOIN file_uploads f ON f.application_id = a.id
+                WHERE a.id = ?
+                GROUP BY a.id
+            ''', (application_id,)).fetchone()
+            conn.close()
+            return tuple(row) if row else None
+        except Exception as e:
+            print(f"❌ Error getting application version: {e}")
+            return None
+    
     def get_application_count(self):
         """Get total number of applications"""
         try:
@@ -189,7 +317,13 @@ class LoanDatabase:
             conn = self.get_connection()
             cursor = conn.cursor()
             
-            cursor.execute('SELECT * FROM file_uploads WHERE application_id = ?', (application_id,))
+            cursor.execute('''
+                SELECT f.*, i.is_pdf, i.page_count, i.encrypted, i.password_ok,
+                       i.flags AS inspection_flags, i.error AS inspection_error, i.inspected_at
+                FROM file_uploads f
+                LEFT JOIN document_inspections i ON i.file_id = f.id
+                WHERE f.application_id = ?
+            ''', (application_id,))
             files = cursor.fetchall()
             
             conn.close()
@@ -199,5 +333,218 @@ class LoanDatabase:
             print(f"❌ Error getting application files: {e}")
             return []
 
+    def stream_applications(self, columns, start_date=None, end_date=None, batch_size=1000):
+        """Yield applications joined with file metadata in fixed-size batches.
+        
+        The connection stays open for the life of the generator and rows are
+        pulled with fetchmany, so memory use does not grow with the table.
+        """
+        conditions = []
+        params = []
+        if start_date:
+            conditions.append('a.submission_date >= ?')
+            params.append(start_date)
+        if end_date:
+            conditions.append("a.submission_date < date(?, '+1 day')")
+            params.append(end_date)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT {', '.join(columns)}
+                FROM applications a
+                LEFT JOIN (
+                    SELECT application_id,
+                           COUNT(*) AS file_count,
+                           SUM(file_size) AS total_file_size,
+                           GROUP_CONCAT(file_type, '; ') AS file_types
+                    FROM file_uploads
+                    GROUP BY application_id
+                ) f ON f.application_id = a.id
+                {where}
+                ORDER BY a.id
+            ''', params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+
+    def find_archive_candidates(self, archive_days, closed_days, closed_statuses, limit, after=None):
+        """Applications older than the retention cutoffs, oldest first.
+        
+        Returns rows with id and submission_date. Pass the (submission_date, id)
+        of the last row seen as `after` to continue past rows that were skipped.
+        """
+        conn = self.get_connection()
+        try:
+            placeholders = ', '.join('?' for _ in closed_statuses)
+            params = [f'-{archive_days} days', *closed_statuses, f'-{closed_days} days']
+            after_condition = ''
+            if after:
+                after_condition = 'AND (submission_date, id) > (?, ?)'
+                params.extend(after)
+            return conn.execute(f'''
+                SELECT id, submission_date FROM applications
+                WHERE (submission_date < datetime('now', ?)
+                       OR (status IN ({placeholders}) AND submission_date < datetime('now', ?)))
+                  {after_condition}
+                ORDER BY submission_date, id
+                LIMIT ?
+            ''', (*params, limit)).fetchall()
+        finally:
+            conn.close()
+    
+    def get_applications_with_files(self, application_ids):
+        """Load applications and their file records for a batch of IDs"""
+        conn = self.get_connection()
+        try:
+            placeholders = ', '.join('?' for _ in application_ids)
+            applications = conn.execute(
+                f'SELECT * FROM applications WHERE id IN ({placeholders})', application_ids
+            ).fetchall()
+            files = conn.execute(
+                f'SELECT * FROM file_uploads WHERE application_id IN ({placeholders})', application_ids
+            ).fetchall()
+            return applications, files
+        finally:
+            conn.close()
+    
+    def archive_applications(self, archived_rows):
+        """Move applications into archived_applications in one transaction.
+        
+        Each row is (id, name, email, phone, loan_amount, status, submission_date, payload).
+        """
+        application_ids = [(row[0],) for row in archived_rows]
+        conn = self.get_connection()
+        try:
+            conn.executemany('''
+                INSERT OR REPLACE INTO archived_applications
+                    (id, name, email, phone, loan_amount, status, submission_date, payload)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', archived_rows)
+            conn.executemany('DELETE FROM document_inspections WHERE application_id = ?', application_ids)
+            conn.executemany('DELETE FROM file_uploads WHERE application_id = ?', application_ids)
+            conn.executemany('DELETE FROM applications WHERE id = ?', application_ids)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
+    def find_purge_candidates(self, purge_days, limit):
+        """Archived applications past the purge cutoff, with their payloads"""
+        conn = self.get_connection()
+        try:
+            return conn.execute('''
+                SELECT id, payload FROM archived_applications
+                WHERE submission_date < datetime('now', ?)
+                ORDER BY submission_date
+                LIMIT ?
+            ''', (f'-{purge_days} days', limit)).fetchall()
+        finally:
+            conn.close()
+    
+    def delete_archived_applications(self, application_ids):
+        """Permanently delete archived applications"""
+        conn = self.get_connection()
+        try:
+            conn.executemany('DELETE FROM archived_applications WHERE id = ?',
+                             [(application_id,) for application_id in application_ids])
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def get_archived_application(self, application_id):
+        """Get an archived application row (payload still compressed)"""
+        try:
+            conn = self.get_connection()
+            row = conn.execute('SELECT * FROM archived_applications WHERE id = ?', (application_id,)).fetchone()
+            conn.close()
+            return row
+        except Exception as e:
+            print(f"❌ Error getting archived application: {e}")
+            return None
+    
+    def get_archived_count(self):
+        """Get total number of archived applications"""
+        try:
+            conn = self.get_connection()
+            count = conn.execute('SELECT COUNT(*) FROM archived_applications').fetchone()[0]
+            conn.close()
+            return count
+        except Exception as e:
+            return 0
+
+    def fetch_json_rows(self, table, fields, where='', params=(), order_by='', limit=None, with_id=False):
+        """Fetch rows already serialized as JSON objects.
+        
+        SQLite's json_object() builds each object, so no per-row dict is created
+        in Python. Falls back to dict serialization when JSON1 is unavailable.
+        `table`, `fields` and `order_by` must come from a whitelist. With
+        `with_id`, returns (id, json) pairs whether or not `fields` includes id.
+        """
+        sql_tail = f"FROM {table} {f'WHERE {where}' if where else ''} {f'ORDER BY {order_by}' if order_by else ''}"
+        if limit is not None:
+            sql_tail += ' LIMIT ?'
+            params = (*params, limit)
+        
+        conn = self.get_connection()
+        try:
+            pairs = ', '.join(f"'{field}', {field}" for field in fields)
+            try:
+                cursor = conn.execute(f'SELECT id, json_object({pairs}) {sql_tail}', params)
+                rows = [(row[0], row[1]) for row in cursor]
+            except sqlite3.OperationalError as e:
+                if 'json_object' not in str(e):
+                    raise
+                cursor = conn.execute(f"SELECT id, {', '.join(fields)} {sql_tail}", params)
+                rows = [(row[0], json.dumps(dict(zip(fields, row[1:])), ensure_ascii=False)) for row in cursor]
+            return rows if with_id else [row[1] for row in rows]
+        finally:
+            conn.close()
+
+    def save_inspection_result(self, result):
+        """Record (or replace) the inspection result for one stored document"""
+        try:
+            conn = self.get_connection()
+            conn.execute('''
+                INSERT OR REPLACE INTO document_inspections
+                    (file_id, application_id, is_pdf, page_count, encrypted, password_ok, metadata, flags, error)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                result['file_id'], result['application_id'], result['is_pdf'], result['page_count'],
+                result['encrypted'], result['password_ok'], json.dumps(result['metadata']),
+                ','.join(result['flags']), result['error']
+            ))
+            conn.commit()
+            conn.close()
+            return True
+        except Exception as e:
+            print(f"❌ Error saving inspection result: {e}")
+            return False
+    
+    def get_uninspected_files(self, limit=None):
+        """Stored documents that have no inspection result yet"""
+        conn = self.get_connection()
+        try:
+            sql = '''
+                SELECT f.id, f.application_id, f.file_path, f.file_password
+                FROM file_uploads f
+                LEFT JOIN document_inspections i ON i.file_id = f.id
+                WHERE i.file_id IS NULL
+                ORDER BY f.id
+            '''
+            if limit:
+                return conn.execute(sql + ' LIMIT ?', (limit,)).fetchall()
+            return conn.execute(sql).fetchall()
+        finally:
+            conn.close()
+
 # Create global database instance
 db = LoanDatabase()
\ No newline at end of file
@@ -6,6 +6,42 @@ from email.mime.base import MIMEBase
 from email import encoders
 from datetime import datetime
 
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, Undefined, select_autoescape
+
+# Layouts can be changed on disk without a code change
+EMAIL_TEMPLATE_FOLDER = os.environ.get(
+    'EMAIL_TEMPLATE_FOLDER',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'email')
+)
+
+EMAIL_TEMPLATES = ('application_notification', 'bulk_import_notification')
+
+
+def _money(value):
+    if isinstance(value, Undefined):
+        return value
+    try:
+        return f"{float(value):,.2f}"
+    except (TypeError, ValueError):
+        return value
+
+
+def create_template_environment(folder=EMAIL_TEMPLATE_FOLDER):
+    """Jinja environment for notification emails; templates compile once per process"""
+    env = Environment(
+        loader=FileSystemLoader(folder),
+        # Jinja's default cache dir is private to this user (0700, ownership checked),
+        # so the workers share compiled templates without trusting a world-writable path
+        bytecode_cache=FileSystemBytecodeCache(),
+        autoescape=select_autoescape(['html']),
+        auto_reload=False,
+        trim_blocks=True,
+        lstrip_blocks=True,
+        keep_trailing_newline=True,
+    )
+    env.filters['money'] = _money
+    return env
+
 class EmailService:
     def __init__(self):
         # Email Configuration - Use environment variables
@@ -15,6 +51,13 @@ class EmailService:
         self.email_password = os.environ.get('EMAIL_PASSWORD', 'ndehjjtarbfaglzk')
         self.admin_email = os.environ.get('ADMIN_EMAIL', 'mohanreddya13@gmail.com')
         
+        # Load and compile every notification template up front
+        self.template_env = create_template_environment()
+        self.templates = {
+            name: (self.template_env.get_template(f'{name}.txt'), self.template_env.get_template(f'{name}.html'))
+            for name in EMAIL_TEMPLATES
+        }
+        
         print(f"📧 Email Service Initialized:")
         print(f"   From: {self.email_address}")
         print(f"   To: {self.admin_email}")
@@ -38,14 +81,14 @@ class EmailService:
         
         try:
             # Create message
-            msg = MIMEMultipart()
+            msg = MIMEMultipart('mixed')
             msg['From'] = self.email_address
             msg['To'] = self.admin_email
             msg['Subject'] = f"🚀 New Loan Application - {application_data['name']} (ID: {application_id})"
             
             # Create email body
-            body = self._create_email_body(application_id, application_data, files_data)
-            msg.attach(MIMEText(body, 'plain'))
+            text, html = self._create_email_body(application_id, application_data, files_data)
+            msg.attach(self._alternative_body(text, html))
             
             print(f"✅ Email content created for application {application_id}")
             
@@ -74,90 +117,60 @@ class EmailService:
             print(f"❌ Error in email sending process: {str(e)}")
             return False
     
-    def _create_email_body(self, application_id, data, files_data):
-        """Create email body content with file passwords"""
+    def send_bulk_import_notification(self, imported):
+        """Send a single summary email for a bulk-imported batch of applications"""
+        print(f"📧 Attempting to send bulk import email for {len(imported)} applications...")
         
-        # Create file passwords section
-        files_section = "\n📎 DOCUMENT PASSWORDS:\n"
-        files_section += "=" * 60 + "\n"
-        
-        if files_data:
-            for file_data in files_data:
-                files_section += f"📄 {file_data['file_type']}:\n"
-                files_section += f"   🔐 Password: {file_data['password']}\n"
-                files_section += f"   📁 File: {file_data.get('original_filename', 'N/A')}\n"
-                files_section += "-" * 40 + "\n"
-        else:
-            files_section += "   No documents uploaded with this application.\n"
+        if not self.is_configured():
+            print("❌ Email not configured - using default credentials")
+            return False
         
-        return f"""
-🚀 NEW LOAN APPLICATION RECEIVED
-==========================================
-📋 Application ID: {application_id}
-📅 Submission Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-
-👤 PERSONAL INFORMATION:
-=======================
-🏷️ Name: {data['name']}
-📅 Date of Birth: {data['dob']}
-📞 Phone: {data['phone']}
-📱 Alternative Phone: {data.get('alt_phone', 'N/A')}
-📧 Email: {data['email']}
-👩‍👦 Mother's Name: {data['mother_name']}
-🎓 Qualification: {data['qualification']}
-
-🏠 ADDRESS DETAILS:
-===================
-📍 Present Address: {data['present_address']}
-⏳ Years at Present Address: {data['present_years']} years
-
-📍 Permanent Address: {data['permanent_address']}
-⏳ Years at Permanent Address: {data['permanent_years']} years
-
-💼 EMPLOYMENT INFORMATION:
-==========================
-🏢 Company: {data['company_name']}
-💼 Designation: {data['designation']}
-📞 Office Contact: {data['office_contact']}
-📧 Official Email: {data['official_email']}
-📍 Company Address: {data['company_address']}
-🏷️ Landmark: {data.get('landmark', 'N/A')}
-
-📊 EXPERIENCE:
-==============
-⏳ Total Experience: {data['total_experience']} years
-🏢 Current Company Experience: {data['company_experience']} years
-
-🏦 BANK DETAILS:
-================
-🏦 Bank Name: {data['bank_name']}
-⏳ Account Years: {data['bank_years']} years
-📍 Branch: {data['branch']}
-
-💰 LOAN DETAILS:
-================
-💵 Loan Amount: ₹{data['loan_amount']:,.2f}
-📅 Tenure: {data['tenure']} months
-🏦 Existing Loan: {data.get('existing_loan', 'None')}
-
-📞 REFERENCES:
-==============
-👥 Friend Reference:
-   - Name: {data['friend_name']}
-   - Contact: {data['friend_contact']}
-   - Address: {data['friend_address']}
-
-👨‍👩‍👧‍👦 Relative Reference:
-   - Name: {data['relative_name']}
-   - Contact: {data['relative_contact']}
-   - Address: {data['relative_address']}
-
-{files_section}
-📝 NOTE: All documents are attached to this email. Use the passwords above to open protected files.
-
-This is an automated notification from the Bank Loan Application System.
-🔗 Application Link: [Available in Admin Panel]
-        """
+        try:
+            msg = MIMEMultipart('mixed')
+            msg['From'] = self.email_address
+            msg['To'] = self.admin_email
+            msg['Subject'] = f"📦 Bulk Import - {len(imported)} New Loan Applications"
+            msg.attach(self._alternative_body(*self._create_bulk_email_body(imported)))
+            
+            success = self._send_email(msg)
+            if success:
+                print(f"✅ Bulk import email sent for {len(imported)} applications")
+            else:
+                print("❌ Failed to send bulk import email")
+            return success
+            
+        except Exception as e:
+            print(f"❌ Error in bulk email sending process: {str(e)}")
+            return False
+    
+    def _create_bulk_email_body(self, imported):
+        """Create (text, html) summary email body for a bulk import"""
+        return self.render('bulk_import_notification', {
+            'imported': imported,
+            'imported_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'total_amount': sum(item['loan_amount'] for item in imported),
+        })
+    
+    def _create_email_body(self, application_id, data, files_data):
+        """Create (text, html) email body content with file passwords"""
+        return self.render('application_notification', {
+            'application_id': application_id,
+            'data': data,
+            'files': files_data,
+            'submitted_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        })
+    
+    def render(self, name, context):
+        """Render the plain text and HTML versions of a notification"""
+        text_template, html_template = self.templates[name]
+        return text_template.render(context), html_template.render(context)
+    
+    def _alternative_body(self, text, html):
+        """Plain text and HTML versions; mail clients show the best one they support"""
+        body = MIMEMultipart('alternative')
+        body.attach(MIMEText(text, 'plain', 'utf-8'))
+        body.attach(MIMEText(html, 'html', 'utf-8'))
+        return body
     
     def _attach_file(self, msg, file_path):
         """Attach file to email"""
@@ -0,0 +1,245 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import sys
+from datetime import datetime
+
+from config import DATABASE_PATH
+
+# Exportable columns: output name -> SQL expression in LoanDatabase.stream_applications.
+# Document passwords are deliberately not exportable.
+EXPORT_COLUMNS = {
+    'id': 'a.id',
+    'name': 'a.name',
+    'dob': 'a.dob',
+    'phone': 'a.phone',
+    'alt_phone': 'a.alt_phone',
+    'email': 'a.email',
+    'mother_name': 'a.mother_name',
+    'qualification': 'a.qualification',
+    'present_address': 'a.present_address',
+    'present_years': 'a.present_years',
+    'permanent_address': 'a.permanent_address',
+    'permanent_years': 'a.permanent_years',
+    'total_experience': 'a.total_experience',
+    'company_experience': 'a.company_experience',
+    'company_name': 'a.company_name',
+    'company_address': 'a.company_address',
+    'landmark': 'a.landmark',
+    'designation': 'a.designation',
+    'office_contact': 'a.office_contact',
+    'official_email': 'a.official_email',
+    'bank_name': 'a.bank_name',
+    'bank_years': 'a.bank_years',
+    'branch': 'a.branch',
+    'loan_amount': 'a.loan_amount',
+    'tenure': 'a.tenure',
+    'existing_loan': 'a.existing_loan',
+    'friend_name': 'a.friend_name',
+    'friend_contact': 'a.friend_contact',
+    'friend_address': 'a.friend_address',
+    'relative_name': 'a.relative_name',
+    'relative_contact': 'a.relative_contact',
+    'relative_address': 'a.relative_address',
+    'status': 'a.status',
+    'score': 'a.score',
+    'submission_date': 'a.submission_date',
+    'file_count': 'COALESCE(f.file_count, 0)',
+    'total_file_size': 'COALESCE(f.total_file_size, 0)',
+    'file_types': "COALESCE(f.file_types, '')",
+}
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def parse_columns(columns):
+    """Validate a comma-separated column list and return output names"""
+    if not columns:
+        return list(EXPORT_COLUMNS)
+    names = [c.strip() for c in columns.split(',') if c.strip()]
+    unknown = [c for c in names if c not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown export columns: {', '.join(unknown)}")
+    return names
+
+
+def parse_date(value, name):
+    """Validate an optional YYYY-MM-DD filter and return it normalised"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value.strip(), '%Y-%m-%d').date().isoformat()
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {value!r} (expected YYYY-MM-DD)") from None
+
+
+def _select_list(names):
+    return [f"{EXPORT_COLUMNS[name]} AS {name}" for name in names]
+
+
+def _csv_chunks(batches, names):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate(0)
+    # Header-only export when there are no rows
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _ndjson_chunks(batches, names):
+    for rows in batches:
+        yield ''.join(
+            json.dumps(dict(zip(names, row)), ensure_ascii=False, default=str) + '\n'
+            for row in rows
+        ).encode('utf-8')
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back in chunks.
+
+    ParquetWriter only needs write/tell, so the output never has to be
+    seekable or held in memory beyond a single row group.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def readable(self):
+        return False
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+# Parquet column types; anything not listed is written as a string
+_PARQUET_TYPES = {
+    'id': 'int64',
+    'tenure': 'int64',
+    'file_count': 'int64',
+    'total_file_size': 'int64',
+    'present_years': 'float64',
+    'permanent_years': 'float64',
+    'total_experience': 'float64',
+    'company_experience': 'float64',
+    'bank_years': 'float64',
+    'loan_amount': 'float64',
+    'score': 'float64',
+}
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError('Parquet export requires the pyarrow package')
+    return pyarrow, pyarrow.parquet
+
+
+def _parquet_chunks(batches, names):
+    pa, pq = _import_pyarrow()
+    # A fixed schema keeps every row group consistent even when a batch is all NULLs
+    schema = pa.schema([(name, pa.type_for_alias(_PARQUET_TYPES.get(name, 'string'))) for name in names])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    for rows in batches:
+        columns = list(zip(*rows))
+        arrays = [pa.array(values, type=field.type) for values, field in zip(columns, schema)]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+_WRITERS = {
+    'csv': _csv_chunks,
+    'ndjson': _ndjson_chunks,
+    'parquet': _parquet_chunks,
+}
+
+
+def export_applications(database, fmt='csv', columns=None, start_date=None, end_date=None,
+                        batch_size=DEFAULT_BATCH_SIZE):
+    """Yield the export as byte chunks, one per batch of rows"""
+    if fmt not in _WRITERS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    names = parse_columns(columns)
+    start_date = parse_date(start_date, 'start_date')
+    end_date = parse_date(end_date, 'end_date')
+    if fmt == 'parquet':
+        _import_pyarrow()
+    batches = database.stream_applications(_select_list(names), start_date, end_date, batch_size)
+    return _WRITERS[fmt](batches, names)
+
+
+def main(argv=None):
+    """Command line entry point: python export.py --format csv -o out.csv"""
+    parser = argparse.ArgumentParser(description='Export loan applications')
+    parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+    parser.add_argument('--columns', help='Comma-separated list of columns (default: all)')
+    parser.add_argument('--start-date', help='Include applications submitted on or after YYYY-MM-DD')
+    parser.add_argument('--end-date', help='Include applications submitted on or before YYYY-MM-DD')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--database', default=DATABASE_PATH)
+    parser.add_argument('-o', '--output', help='Output file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    # Keep startup logging out of the export when writing to stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        from database import LoanDatabase
+        database = LoanDatabase(args.database)
+
+    try:
+        chunks = export_applications(database, args.format, args.columns,
+                                     args.start_date, args.end_date, args.batch_size)
+    except ValueError as e:
+        parser.error(str(e))
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,17 @@
+# gunicorn settings for Render: gunicorn -c gunicorn.conf.py
+# SERVER_MODE=sync (default) serves app:app on sync workers.
+# SERVER_MODE=async serves asgi:application on uvicorn workers, which buffer
+# slow uploads on an event loop instead of tying up a worker per connection.
+import os
+
+SERVER_MODE = os.environ.get('SERVER_MODE', 'sync').lower()
+
+if SERVER_MODE == 'async':
+    wsgi_app = 'asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'app:app'
+    worker_class = 'sync'
+
+# Uploads of up to 10MB from slow mobile connections can take a while
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
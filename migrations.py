@@ -0,0 +1,281 @@
+import sqlite3
+import threading
+import time
+
+# Serialises migration runs inside one process; BEGIN IMMEDIATE below does
+# the same job across gunicorn workers sharing the database file.
+_migration_lock = threading.Lock()
+
+SCHEMA_VERSION_TABLE = 'schema_version'
+
+
+def _add_column(cursor, table, column, definition):
+    """Add a column unless it already exists (ALTER TABLE has no IF NOT EXISTS)"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    existing = {row[1] for row in cursor.fetchall()}
+    if column not in existing:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+def _migration_001_base_tables(cursor):
+    """Create the original applications and file_uploads tables"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS applications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            dob TEXT NOT NULL,
+            phone TEXT NOT NULL,
+            mother_name TEXT NOT NULL,
+            qualification TEXT NOT NULL,
+            alt_phone TEXT,
+            email TEXT NOT NULL,
+            present_address TEXT NOT NULL,
+            present_years REAL NOT NULL,
+            permanent_address TEXT NOT NULL,
+            permanent_years REAL NOT NULL,
+            total_experience REAL NOT NULL,
+            company_experience REAL NOT NULL,
+            company_name TEXT NOT NULL,
+            company_address TEXT NOT NULL,
+            landmark TEXT,
+            designation TEXT NOT NULL,
+            office_contact TEXT NOT NULL,
+            official_email TEXT NOT NULL,
+            bank_name TEXT NOT NULL,
+            bank_years REAL NOT NULL,
+            branch TEXT NOT NULL,
+            loan_amount REAL NOT NULL,
+            tenure INTEGER NOT NULL,
+            existing_loan TEXT,
+            friend_name TEXT NOT NULL,
+            friend_contact TEXT NOT NULL,
+            friend_address TEXT NOT NULL,
+            relative_name TEXT NOT NULL,
+            relative_contact TEXT NOT NULL,
+            relative_address TEXT NOT NULL,
+            submission_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS file_uploads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            application_id INTEGER,
+            file_type TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            file_password TEXT NOT NULL,
+            upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (application_id) REFERENCES applications (id)
+        )
+    ''')
+
+
+def _migration_002_file_metadata(cursor):
+    """Record size and SHA-256 of every stored document"""
+    _add_column(cursor, 'file_uploads', 'file_size', 'INTEGER')
+    _add_column(cursor, 'file_uploads', 'file_hash', 'TEXT')
+
+
+def _migration_003_application_status(cursor):
+    """Track review status and credit score per application"""
+    _add_column(cursor, 'applications', 'status', "TEXT NOT NULL DEFAULT 'submitted'")
+    _add_column(cursor, 'applications', 'score', 'REAL')
+
+
+def _migration_004_archive_table(cursor):
+    """Compressed cold copy of applications removed by the retention engine"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archived_applications (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            email TEXT NOT NULL,
+            phone TEXT NOT NULL,
+            loan_amount REAL NOT NULL,
+            status TEXT NOT NULL,
+            submission_date TIMESTAMP,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            payload BLOB NOT NULL
+        )
+    ''')
+
+
+def _migration_005_idempotency_keys(cursor):
+    """Client-supplied keys that make /apply retries safe"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            idempotency_key TEXT NOT NULL,
+            request_hash TEXT NOT NULL,
+            application_id INTEGER,
+            status_code INTEGER,
+            response_body TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_idempotency_keys_key
+        ON idempotency_keys (idempotency_key)
+    ''')
+
+
+def _migration_006_document_inspections(cursor):
+    """Results of the background PDF inspection of each stored document"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS document_inspections (
+            file_id INTEGER PRIMARY KEY,
+            application_id INTEGER NOT NULL,
+            is_pdf INTEGER NOT NULL,
+            page_count INTEGER,
+            encrypted INTEGER,
+            password_ok INTEGER,
+            metadata TEXT,
+            flags TEXT NOT NULL DEFAULT '',
+            error TEXT,
+            inspected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (file_id) REFERENCES file_uploads (id)
+        )
+    ''')
+
+
+# Ordered list of (version, description, function). Never edit or reorder a
+# migration that has shipped - append a new one instead.
+MIGRATIONS = [
+    (1, 'base tables', _migration_001_base_tables),
+    (2, 'file size and hash columns', _migration_002_file_metadata),
+    (3, 'application status and score columns', _migration_003_application_status),
+    (4, 'archived applications table', _migration_004_archive_table),
+    (5, 'idempotency keys table', _migration_005_idempotency_keys),
+    (6, 'document inspections table', _migration_006_document_inspections),
+]
+
+# Indexes the application relies on: name -> (table, columns).
+# They are built after the migrations, one short transaction each.
+EXPECTED_INDEXES = {
+    'idx_applications_submission_date': ('applications', 'submission_date'),
+    'idx_applications_email': ('applications', 'email'),
+    'idx_applications_phone': ('applications', 'phone'),
+    'idx_applications_status': ('applications', 'status'),
+    'idx_file_uploads_application_id': ('file_uploads', 'application_id'),
+    'idx_file_uploads_file_hash': ('file_uploads', 'file_hash'),
+    'idx_archived_applications_submission_date': ('archived_applications', 'submission_date'),
+    'idx_idempotency_keys_created_at': ('idempotency_keys', 'created_at'),
+    'idx_document_inspections_application_id': ('document_inspections', 'application_id'),
+}
+
+# Tables smaller than this are not reported for full scans
+FULL_SCAN_MIN_ROWS = 1000
+
+# Hot queries checked with EXPLAIN QUERY PLAN at startup
+HOT_QUERIES = {
+    'get_application': ('SELECT * FROM applications WHERE id = ?', (1,)),
+    'get_all_applications': ('SELECT * FROM applications ORDER BY submission_date DESC', ()),
+    'get_application_files': ('SELECT * FROM file_uploads WHERE application_id = ?', (1,)),
+    'get_application_count': ('SELECT COUNT(*) FROM applications', ()),
+}
+
+
+def get_schema_version(conn):
+    """Return the highest applied migration version (0 for a fresh database)"""
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    row = conn.execute(f'SELECT MAX(version) FROM {SCHEMA_VERSION_TABLE}').fetchone()
+    return row[0] or 0
+
+
+def run_migrations(conn):
+    """Apply every pending migration once, each in its own transaction"""
+    applied = []
+    with _migration_lock:
+        # Manage transactions explicitly so DDL and the version row commit together
+        previous_isolation = conn.isolation_level
+        conn.isolation_level = None
+        try:
+            get_schema_version(conn)
+            for version, description, migrate in MIGRATIONS:
+                # Take the write lock first, then re-read the version: another
+                # worker may have applied this migration while we waited.
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    if version <= get_schema_version(conn):
+                        conn.execute('COMMIT')
+                        continue
+                    migrate(conn.cursor())
+                    conn.execute(
+                        f'INSERT INTO {SCHEMA_VERSION_TABLE} (version, description) VALUES (?, ?)',
+                        (version, description)
+                    )
+                    conn.execute('COMMIT')
+                    applied.append(version)
+                    print(f"✅ Migration {version} applied: {description}")
+                except Exception:
+                    conn.execute('ROLLBACK')
+                    raise
+        finally:
+            conn.isolation_level = previous_isolation
+    return applied
+
+
+def build_indexes(conn, busy_pause=0.05):
+    """Create missing expected indexes one at a time.
+
+    SQLite cannot build an index without holding the write lock, so each
+    index gets its own short transaction with a pause in between, letting
+    queued writers run instead of waiting for the whole batch.
+    """
+    built = []
+    with _migration_lock:
+        for index_name in missing_indexes(conn):
+            table, columns = EXPECTED_INDEXES[index_name]
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({columns})')
+            conn.commit()
+            built.append(index_name)
+            print(f"✅ Index built: {index_name}")
+            time.sleep(busy_pause)
+        if built:
+            # Refresh planner statistics so the new indexes are actually used
+            conn.execute('ANALYZE')
+            conn.commit()
+    return built
+
+
+def missing_indexes(conn):
+    """Return names of expected indexes that do not exist"""
+    rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()
+    existing = {row[0] for row in rows}
+    return [name for name in EXPECTED_INDEXES if name not in existing]
+
+
+def _has_rows(conn, table, count):
+    """True when the table holds at least `count` rows (without a full COUNT)"""
+    row = conn.execute(f'SELECT COUNT(*) FROM (SELECT 1 FROM {table} LIMIT ?)', (count,)).fetchone()
+    return row[0] >= count
+
+
+def _scanned_table(detail):
+    """Table name from "SCAN t" (SQLite 3.36+) or "SCAN TABLE t" (older versions)"""
+    words = detail.split()
+    if len(words) > 2 and words[1] == 'TABLE':
+        return words[2]
+    return words[1]
+
+
+def find_full_scans(conn, queries=None):
+    """Run EXPLAIN QUERY PLAN on hot queries and report full table scans"""
+    warnings = []
+    for label, (sql, params) in (queries or HOT_QUERIES).items():
+        try:
+            plan = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+            for row in plan:
+                detail = row[-1]
+                # "SCAN t USING INDEX ..." walks an index; a bare "SCAN t" reads every row.
+                # The planner rightly scans tiny tables, so only warn once they have grown.
+                if detail.startswith('SCAN') and 'USING' not in detail:
+                    if _has_rows(conn, _scanned_table(detail), FULL_SCAN_MIN_ROWS):
+                        warnings.append(f"{label}: full table scan ({detail})")
+        except sqlite3.Error as e:
+            warnings.append(f"{label}: could not explain query ({e})")
+    return warnings
@@ -0,0 +1,274 @@
+import argparse
+import multiprocessing
+import os
+import re
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from functools import partial
+
+from config import DATABASE_PATH
+
+try:
+    from pypdf import PdfReader
+    from pypdf.errors import DependencyError
+except ImportError:
+    PdfReader = None
+
+    class DependencyError(Exception):
+        pass
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+PDF_MAGIC = b'%PDF-'
+
+# Passwords the form stores when the applicant gave none
+NO_PASSWORD_VALUES = {'', 'no password'}
+
+INSPECTION_WORKERS = int(os.environ.get('INSPECTION_WORKERS', 2))
+
+# A crafted PDF can make the parser loop or balloon; cap each document
+INSPECTION_TIMEOUT = float(os.environ.get('INSPECTION_TIMEOUT', 30))
+INSPECTION_MEMORY_MB = int(os.environ.get('INSPECTION_MEMORY_MB', 1024))
+
+# Metadata keys copied from the PDF document info dictionary
+METADATA_KEYS = ('/Title', '/Author', '/Creator', '/Producer', '/CreationDate', '/ModDate')
+
+# Fallback page count when pypdf is not installed: "/Type /Page" but not "/Type /Pages"
+_PAGE_PATTERN = re.compile(rb'/Type\s*/Page(?![a-zA-Z])')
+
+
+def _has_password(password):
+    return (password or '').strip().lower() not in NO_PASSWORD_VALUES
+
+
+class InspectionTimeout(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise InspectionTimeout(f"Inspection took longer than {INSPECTION_TIMEOUT:g} s")
+
+
+@contextmanager
+def _time_limit(seconds):
+    """Interrupt the inspection after `seconds`.
+
+    The alarm covers pure-Python parsing loops. The CPU limit is a backstop
+    for time spent in C code: the kernel kills the worker, and the pool is
+    recycled by InspectionPool._record.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        # Signals only reach the main thread, which is where pool workers run tasks
+        yield
+        return
+    previous = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        cpu_limit = int(usage.ru_utime + usage.ru_stime + seconds) + 5
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, resource.getrlimit(resource.RLIMIT_CPU)[1]))
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def limit_worker_memory(megabytes=INSPECTION_MEMORY_MB):
+    """Pool initializer: a parser blow-up fails with MemoryError instead of
+    growing the worker until the host kills something else"""
+    if resource is not None:
+        limit = megabytes * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, resource.getrlimit(resource.RLIMIT_AS)[1]))
+
+
+def _new_result(file_id, application_id):
+    return {
+        'file_id': file_id,
+        'application_id': application_id,
+        'is_pdf': False,
+        'page_count': None,
+        'encrypted': None,
+        'password_ok': None,
+        'metadata': {},
+        'flags': [],
+        'error': None,
+    }
+
+
+def _inspect_with_pypdf(path, password, result):
+    reader = PdfReader(path)
+    result['encrypted'] = reader.is_encrypted
+    if reader.is_encrypted:
+        # Owner-password-only files open with an empty user password
+        opened = bool(reader.decrypt(''))
+        if not opened and _has_password(password):
+            opened = bool(reader.decrypt(password))
+        result['password_ok'] = opened
+        if not opened:
+            return
+    result['page_count'] = len(reader.pages)
+    info = reader.metadata or {}
+    result['metadata'] = {key.lstrip('/'): str(info[key]) for key in METADATA_KEYS if key in info}
+
+
+def _inspect_with_scan(path, result):
+    with open(path, 'rb') as f:
+        data = f.read()
+    result['encrypted'] = b'/Encrypt' in data
+    if not result['encrypted']:
+        result['page_count'] = len(_PAGE_PATTERN.findall(data))
+
+
+def inspect_pdf(file_id, application_id, path, password):
+    """Inspect one stored document. Runs in a worker process, so it only
+    takes and returns plain picklable values."""
+    result = _new_result(file_id, application_id)
+    try:
+        with open(path, 'rb') as f:
+            result['is_pdf'] = f.read(len(PDF_MAGIC)) == PDF_MAGIC
+        if not result['is_pdf']:
+            result['flags'].append('not_pdf')
+            return result
+
+        with _time_limit(INSPECTION_TIMEOUT):
+            if PdfReader is not None:
+                _inspect_with_pypdf(path, password, result)
+            else:
+                _inspect_with_scan(path, result)
+    except InspectionTimeout as e:
+        result['flags'].append('timeout')
+        result['error'] = str(e)
+        return result
+    except FileNotFoundError:
+        result['flags'].append('missing_file')
+        result['error'] = 'File not found'
+        return result
+    except DependencyError as e:
+        # AES-encrypted files need pypdf's crypto extra; the file itself may be fine
+        result['flags'].append('decryption_unsupported')
+        result['error'] = f"DependencyError: {e}"
+        return result
+    except Exception as e:
+        result['flags'].append('unreadable')
+        result['error'] = f"{type(e).__name__}: {e}"
+        return result
+
+    if result['encrypted'] and not _has_password(password):
+        result['flags'].append('encrypted_without_password')
+    if result['password_ok'] is False and _has_password(password):
+        result['flags'].append('wrong_password')
+    if result['encrypted'] is False and _has_password(password):
+        result['flags'].append('password_but_not_encrypted')
+    if result['page_count'] == 0:
+        result['flags'].append('no_pages')
+    return result
+
+
+class InspectionPool:
+    """Process pool that inspects documents off the request path.
+
+    The pool is created lazily so it is forked inside each gunicorn worker,
+    not in the master. Results are written to the database from the done
+    callback, which runs in a thread of this process.
+    """
+
+    def __init__(self, database, max_workers=INSPECTION_WORKERS):
+        self.database = database
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # Not plain fork: a child forked mid-request would inherit the
+                # client socket and keep the connection open after the response
+                context = multiprocessing.get_context('forkserver')
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context,
+                                                     initializer=limit_worker_memory)
+            return self._executor
+
+    def _recycle(self, executor):
+        """Drop a pool whose worker was killed, so the next submit starts a fresh one"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def submit_application(self, application_id):
+        """Queue every document of an application for inspection"""
+        files = self.database.get_application_files(application_id)
+        return [self.submit_file(f['id'], application_id, f['file_path'], f['file_password']) for f in files]
+
+    def submit_file(self, file_id, application_id, path, password, retried=False):
+        executor = self._get_executor()
+        try:
+            future = executor.submit(inspect_pdf, file_id, application_id, path, password)
+        except BrokenProcessPool:
+            # A worker died while the pool was idle
+            self._recycle(executor)
+            executor = self._get_executor()
+            future = executor.submit(inspect_pdf, file_id, application_id, path, password)
+        future.add_done_callback(partial(self._record, executor=executor,
+                                         args=(file_id, application_id, path, password), retried=retried))
+        return future
+
+    def _record(self, future, executor, args, retried):
+        try:
+            result = future.result()
+        except BrokenProcessPool as e:
+            # A worker hit the CPU backstop or was otherwise killed, which fails every
+            # document queued in that pool. Retry once so only the culprit is flagged.
+            self._recycle(executor)
+            if not retried:
+                self.submit_file(*args, retried=True)
+                return
+            result = _new_result(*args[:2])
+            result['flags'].append('timeout')
+            result['error'] = f"Inspection worker was killed: {e}"
+        except Exception as e:
+            print(f"❌ Document inspection failed: {e}")
+            return
+        self.database.save_inspection_result(result)
+        if result['flags']:
+            print(f"🚩 Document {result['file_id']} (application {result['application_id']}) "
+                  f"flagged: {', '.join(result['flags'])}")
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+def main(argv=None):
+    """Command line entry point: inspect every document without a result yet"""
+    parser = argparse.ArgumentParser(description='Inspect stored loan documents')
+    parser.add_argument('--database', default=DATABASE_PATH)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--limit', type=int)
+    args = parser.parse_args(argv)
+
+    from database import LoanDatabase
+    database = LoanDatabase(args.database)
+    files = database.get_uninspected_files(args.limit)
+    print(f"🔍 Inspecting {len(files)} documents with {args.workers} workers")
+
+    flagged = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=limit_worker_memory) as pool:
+        rows = [(f['id'], f['application_id'], f['file_path'], f['file_password']) for f in files]
+        for result in pool.map(inspect_pdf, *zip(*rows), chunksize=16) if rows else []:
+            database.save_inspection_result(result)
+            flagged += bool(result['flags'])
+    print(f"✅ Inspected {len(files)} documents, {flagged} flagged")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+# Buckets idle longer than this are deleted by the occasional cleanup
+BUCKET_IDLE_SECONDS = 3600
+
+# Roughly one request in this many triggers the cleanup
+CLEANUP_EVERY = 500
+
+
+def parse_limit(spec):
+    """Parse 'count/seconds' (e.g. '10/60') into (capacity, tokens per second)"""
+    count, seconds = spec.split('/', 1)
+    count, seconds = float(count), float(seconds)
+    if count <= 0 or seconds <= 0:
+        raise ValueError(f"Invalid rate limit: {spec}")
+    return count, count / seconds
+
+
+class SharedStore:
+    """Small SQLite file shared by every gunicorn worker on the host"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connection().execute('PRAGMA journal_mode=WAL')
+
+    def _connection(self):
+        # One connection per thread, kept open: the checks run on every limited request
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=0.5, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+
+class RateLimiter(SharedStore):
+    """Token-bucket rate limiter with buckets stored in a small SQLite file.
+
+    Every gunicorn worker on the host opens the same file, so a client cannot
+    multiply its allowance by landing on different workers. Each check is one
+    short BEGIN IMMEDIATE transaction.
+    """
+
+    def __init__(self, db_path):
+        super().__init__(db_path)
+        self._connection().execute('''
+            CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+                bucket_key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+
+    def allow(self, key, capacity, refill_rate, cost=1.0):
+        """Take `cost` tokens from the bucket. Returns (allowed, retry_after_seconds)."""
+        now = time.time()
+        try:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute(
+                    'SELECT tokens, updated_at FROM rate_limit_buckets WHERE bucket_key = ?', (key,)
+                ).fetchone()
+                tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * refill_rate)
+                allowed = tokens >= cost
+                if allowed:
+                    tokens -= cost
+                conn.execute('''
+                    INSERT INTO rate_limit_buckets (bucket_key, tokens, updated_at) VALUES (?, ?, ?)
+                    ON CONFLICT(bucket_key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at
+                ''', (key, tokens, now))
+                if random.randrange(CLEANUP_EVERY) == 0:
+                    conn.execute('DELETE FROM rate_limit_buckets WHERE updated_at < ?',
+                                 (now - BUCKET_IDLE_SECONDS,))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            # Fail open: a busy limiter must not take the site down with it
+            print(f"⚠️ Rate limiter unavailable, allowing request: {e}")
+            return True, 0
+        retry_after = 0 if allowed else (cost - tokens) / refill_rate
+        return allowed, retry_after
+
+
+class AdmissionController(SharedStore):
+    """Sheds load when too many requests are in flight or latency is too high.
+
+    State lives in the rate limiter's SQLite file, so the in-flight count and
+    latency cover every worker on the host, not just this process. Each
+    admitted request holds a slot row until it finishes; slots older than
+    `slot_timeout` (a worker killed mid-request) are dropped.
+
+    Latency is an exponentially weighted moving average of admitted requests.
+    While shedding on latency, one probe request is let through every
+    `probe_interval` seconds so the average can recover.
+    """
+
+    def __init__(self, db_path, max_in_flight, latency_threshold, probe_interval=5.0, smoothing=0.2,
+                 slot_timeout=120.0):
+        super().__init__(db_path)
+        self.max_in_flight = max_in_flight
+        self.latency_threshold = latency_threshold
+        self.probe_interval = probe_interval
+        self.smoothing = smoothing
+        self.slot_timeout = slot_timeout
+        conn = self._connection()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS admission_slots (
+                slot_id TEXT PRIMARY KEY,
+                entered_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS admission_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                latency REAL NOT NULL,
+                last_sample REAL NOT NULL,
+                shed_count INTEGER NOT NULL
+            )
+        ''')
+        conn.execute('INSERT OR IGNORE INTO admission_state VALUES (1, 0.0, ?, 0)', (time.time(),))
+
+    def _update(self, work):
+        """Run work(conn, now) in one BEGIN IMMEDIATE transaction"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = work(conn, time.time())
+            conn.execute('COMMIT')
+            return result
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def try_enter(self):
+        """Returns a slot id to pass to exit(), or None if the request is shed"""
+        slot_id = uuid.uuid4().hex
+
+        def enter(conn, now):
+            conn.execute('DELETE FROM admission_slots WHERE entered_at < ?', (now - self.slot_timeout,))
+            in_flight = conn.execute('SELECT COUNT(*) FROM admission_slots').fetchone()[0]
+            latency, last_sample = conn.execute(
+                'SELECT latency, last_sample FROM admission_state WHERE id = 1'
+            ).fetchone()
+            overloaded = in_flight >= self.max_in_flight
+            slow = latency > self.latency_threshold and now - last_sample < self.probe_interval
+            if overloaded or slow:
+                conn.execute('UPDATE admission_state SET shed_count = shed_count + 1 WHERE id = 1')
+                return None
+            if latency > self.latency_threshold:
+                # This request is the probe; hold the others until the next interval
+                conn.execute('UPDATE admission_state SET last_sample = ? WHERE id = 1', (now,))
+            conn.execute('INSERT INTO admission_slots VALUES (?, ?)', (slot_id, now))
+            return slot_id
+
+        try:
+            return self._update(enter)
+        except sqlite3.Error as e:
+            print(f"⚠️ Admission control unavailable, admitting request: {e}")
+            return slot_id
+
+    def exit(self, slot_id, duration=None):
+        """Release the slot; duration (seconds) feeds the latency average when given"""
+        def leave(conn, now):
+            conn.execute('DELETE FROM admission_slots WHERE slot_id = ?', (slot_id,))
+            if duration is not None:
+                conn.execute('''
+                    UPDATE admission_state SET latency = latency + ? * (? - latency), last_sample = ?
+                    WHERE id = 1
+                ''', (self.smoothing, duration, now))
+
+        try:
+            self._update(leave)
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not release admission slot: {e}")
+
+    def stats(self):
+        conn = self._connection()
+        in_flight = conn.execute('SELECT COUNT(*) FROM admission_slots').fetchone()[0]
+        latency, shed_count = conn.execute(
+            'SELECT latency, shed_count FROM admission_state WHERE id = 1'
+        ).fetchone()
+        return {
+            'in_flight': in_flight,
+            'max_in_flight': self.max_in_flight,
+            'latency_ewma_seconds': round(latency, 4),
+            'latency_threshold_seconds': self.latency_threshold,
+            'shed_count': shed_count,
+        }
@@ -0,0 +1,212 @@
+import argparse
+import gzip
+import json
+import os
+import shutil
+import time
+import zlib
+
+from config import (DATABASE_PATH, UPLOAD_FOLDER, COLD_STORAGE_FOLDER, RETENTION_ARCHIVE_DAYS,
+                    RETENTION_CLOSED_DAYS, RETENTION_PURGE_DAYS, IDEMPOTENCY_KEY_TTL_HOURS)
+from storage import resolve_stored_path
+
+# Statuses after which an application no longer needs to stay in the hot tables
+CLOSED_STATUSES = ('approved', 'rejected', 'closed', 'withdrawn')
+
+DEFAULT_BATCH_SIZE = 200
+
+# Pause between batches so request workers can get the write lock
+DEFAULT_BATCH_PAUSE = 0.2
+
+
+class RetentionPolicy:
+    """How long applications stay hot, archived, and at all"""
+
+    def __init__(self, archive_days=RETENTION_ARCHIVE_DAYS, closed_days=RETENTION_CLOSED_DAYS,
+                 purge_days=RETENTION_PURGE_DAYS, closed_statuses=CLOSED_STATUSES):
+        self.archive_days = archive_days
+        self.closed_days = closed_days
+        self.purge_days = purge_days
+        self.closed_statuses = tuple(closed_statuses)
+
+    def to_dict(self):
+        return {
+            'archive_days': self.archive_days,
+            'closed_days': self.closed_days,
+            'purge_days': self.purge_days,
+            'closed_statuses': list(self.closed_statuses),
+        }
+
+
+def decode_payload(payload):
+    """Decompress an archived application payload back into a dict"""
+    return json.loads(zlib.decompress(payload).decode('utf-8'))
+
+
+def _encode_payload(application, files):
+    return zlib.compress(json.dumps({'application': application, 'files': files}).encode('utf-8'), 9)
+
+
+class RetentionEngine:
+    """Moves old applications to the archive table and their PDFs to cold storage.
+
+    Stored file paths are resolved against `upload_root`. Applications whose
+    documents cannot be found there are skipped and reported, not archived.
+    """
+
+    def __init__(self, database, policy=None, cold_root=COLD_STORAGE_FOLDER,
+                 batch_size=DEFAULT_BATCH_SIZE, batch_pause=DEFAULT_BATCH_PAUSE, dry_run=False,
+                 upload_root=UPLOAD_FOLDER):
+        self.database = database
+        self.policy = policy or RetentionPolicy()
+        self.cold_root = cold_root
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.dry_run = dry_run
+        self.upload_root = upload_root
+        self.skipped = []
+
+    def run(self, max_batches=None):
+        """Archive then purge, returning counts"""
+        archived = self.archive(max_batches)
+        purged = self.purge(max_batches)
+        keys_purged = 0 if self.dry_run else self.database.purge_idempotency_keys(IDEMPOTENCY_KEY_TTL_HOURS)
+        print(f"✅ Retention run finished: {archived} archived, {purged} purged, "
+              f"{len(self.skipped)} skipped with missing documents, "
+              f"{keys_purged} expired idempotency keys removed")
+        return {'archived': archived, 'purged': purged, 'skipped_missing_documents': self.skipped,
+                'idempotency_keys_purged': keys_purged, 'dry_run': self.dry_run,
+                'policy': self.policy.to_dict()}
+
+    def archive(self, max_batches=None):
+        total = 0
+        batches = 0
+        after = None
+        while max_batches is None or batches < max_batches:
+            rows = self.database.find_archive_candidates(
+                self.policy.archive_days, self.policy.closed_days,
+                self.policy.closed_statuses, self.batch_size, after
+            )
+            if not rows:
+                break
+            ids = [row['id'] for row in rows]
+            # Skipped applications stay in the table, so continue after this batch
+            after = (rows[-1]['submission_date'], rows[-1]['id'])
+            if self.dry_run:
+                # Candidates never leave the table, so one batch is all we can report
+                print(f"ℹ️ Dry run: would archive applications {ids}")
+                return len(ids)
+            total += self._archive_batch(ids)
+            batches += 1
+            time.sleep(self.batch_pause)
+        return total
+
+    def _archive_batch(self, ids):
+        applications, files = self.database.get_applications_with_files(ids)
+        files_by_app = {}
+        for file_row in files:
+            files_by_app.setdefault(file_row['application_id'], []).append(dict(file_row))
+
+        archived_rows = []
+        hot_paths = []
+        for application in applications:
+            application = dict(application)
+            app_files = files_by_app.get(application['id'], [])
+            paths = [self._resolve(file_record['file_path']) for file_record in app_files]
+            missing = [path for path in paths if not os.path.exists(path)]
+            if missing:
+                # Archiving now would delete the only reference to the documents
+                print(f"⚠️ Skipping application {application['id']}: documents not found: {missing}")
+                self.skipped.append(application['id'])
+                continue
+            # Copy to cold storage first; hot files are only removed after the DB commit
+            for file_record, path in zip(app_files, paths):
+                file_record['cold_path'] = self._to_cold_storage(application['id'], path)
+                hot_paths.append(path)
+            archived_rows.append((
+                application['id'], application['name'], application['email'], application['phone'],
+                application['loan_amount'], application['status'], application['submission_date'],
+                _encode_payload(application, app_files)
+            ))
+
+        if not archived_rows:
+            return 0
+        self.database.archive_applications(archived_rows)
+
+        for path in hot_paths:
+            self._remove_file(path)
+        print(f"📦 Archived {len(archived_rows)} applications, {len(hot_paths)} documents moved to cold storage")
+        return len(archived_rows)
+
+    def _resolve(self, file_path):
+        return resolve_stored_path(file_path or '', self.upload_root, UPLOAD_FOLDER)
+
+    def _to_cold_storage(self, application_id, file_path):
+        cold_dir = os.path.join(self.cold_root, str(application_id))
+        os.makedirs(cold_dir, exist_ok=True)
+        cold_path = os.path.join(cold_dir, os.path.basename(file_path) + '.gz')
+        with open(file_path, 'rb') as source, gzip.open(cold_path, 'wb', compresslevel=9) as dest:
+            shutil.copyfileobj(source, dest, 1024 * 1024)
+        return cold_path
+
+    def _remove_file(self, path):
+        try:
+            os.remove(path)
+            folder = os.path.dirname(path)
+            if folder and not os.listdir(folder):
+                os.rmdir(folder)
+        except OSError as e:
+            print(f"⚠️ Could not remove {path}: {e}")
+
+    def purge(self, max_batches=None):
+        total = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            rows = self.database.find_purge_candidates(self.policy.purge_days, self.batch_size)
+            if not rows:
+                break
+            ids = [row['id'] for row in rows]
+            if self.dry_run:
+                print(f"ℹ️ Dry run: would purge archived applications {ids}")
+                return len(ids)
+            self.database.delete_archived_applications(ids)
+            for row in rows:
+                for file_record in decode_payload(row['payload'])['files']:
+                    if file_record.get('cold_path'):
+                        self._remove_file(file_record['cold_path'])
+            total += len(ids)
+            batches += 1
+            print(f"🗑️ Purged {len(ids)} archived applications")
+            time.sleep(self.batch_pause)
+        return total
+
+
+def main(argv=None):
+    """Command line entry point: python retention.py [--dry-run]"""
+    parser = argparse.ArgumentParser(description='Archive and purge old loan applications')
+    parser.add_argument('--database', default=DATABASE_PATH)
+    parser.add_argument('--upload-folder', default=UPLOAD_FOLDER,
+                        help='Folder holding the uploaded documents, if run from another directory')
+    parser.add_argument('--cold-storage', default=COLD_STORAGE_FOLDER)
+    parser.add_argument('--archive-days', type=int, default=RETENTION_ARCHIVE_DAYS,
+                        help='Archive any application older than this')
+    parser.add_argument('--closed-days', type=int, default=RETENTION_CLOSED_DAYS,
+                        help='Archive closed applications older than this')
+    parser.add_argument('--purge-days', type=int, default=RETENTION_PURGE_DAYS,
+                        help='Delete archived applications older than this')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--batch-pause', type=float, default=DEFAULT_BATCH_PAUSE)
+    parser.add_argument('--max-batches', type=int)
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args(argv)
+
+    from database import LoanDatabase
+    database = LoanDatabase(args.database)
+    policy = RetentionPolicy(args.archive_days, args.closed_days, args.purge_days)
+    engine = RetentionEngine(database, policy, args.cold_storage, args.batch_size,
+                             args.batch_pause, args.dry_run, args.upload_folder)
+    print(json.dumps(engine.run(args.max_batches), indent=2))
+
+
+if __name__ == '__main__':
+    main()
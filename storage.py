@@ -0,0 +1,32 @@
+import hashlib
+import os
+
+
+def user_folder_path(upload_root, name, application_id):
+    """Folder holding one application's documents"""
+    safe_name = "".join(c for c in name if c.isalnum() or c in (' ', '-', '_')).rstrip()
+    return os.path.join(upload_root, f"{safe_name}_{application_id}")
+
+
+def file_sha256(file_path, chunk_size=64 * 1024):
+    """Compute SHA-256 of a stored file in fixed-size chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def resolve_stored_path(file_path, upload_root, stored_root):
+    """Locate a stored document from any working directory.
+
+    Documents are saved as os.path.join(stored_root, ...), where stored_root is
+    the app's UPLOAD_FOLDER and may be relative to the app's working directory.
+    Relative paths under stored_root are re-rooted at upload_root.
+    """
+    if not file_path or os.path.isabs(file_path):
+        return file_path
+    rel_path = os.path.relpath(file_path, stored_root)
+    if rel_path.startswith(os.pardir):
+        return file_path
+    return os.path.join(upload_root, rel_path)
@@ -0,0 +1,82 @@
+ALLOWED_EXTENSIONS = {'pdf'}
+
+# File type mapping
+FILE_TYPES = {
+    'aadhar': 'Aadhar Card',
+    'pan': 'PAN Card',
+    'salary_slips': 'Salary Slips',
+    'bank_statement': 'Bank Statement',
+    'offer_letter': 'Offer Letter',
+    'relieving_letter': 'Relieving Letter'
+}
+
+REQUIRED_FIELDS = [
+    'name', 'dob', 'phone', 'mother_name', 'qualification', 'email',
+    'present_address', 'present_years', 'permanent_address', 'permanent_years',
+    'total_experience', 'company_experience', 'company_name', 'company_address',
+    'designation', 'office_contact', 'official_email', 'bank_name', 'bank_years',
+    'branch', 'loan_amount', 'tenure', 'friend_name', 'friend_contact',
+    'friend_address', 'relative_name', 'relative_contact', 'relative_address'
+]
+
+FLOAT_FIELDS = [
+    'present_years', 'permanent_years', 'total_experience',
+    'company_experience', 'bank_years', 'loan_amount'
+]
+
+INT_FIELDS = ['tenure']
+
+OPTIONAL_FIELDS = ['alt_phone', 'landmark', 'existing_loan']
+
+
+def allowed_file(filename):
+    """Check if file extension is allowed"""
+    return '.' in filename and \
+           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def _clean(value):
+    return '' if value is None else str(value).strip()
+
+
+def validate_application_data(source):
+    """Validate and convert application fields.
+
+    `source` is anything with a dict-style get() - request.form for /apply,
+    or a parsed CSV/NDJSON row for bulk imports. Returns (form_data, error)
+    where error is None when the data is valid.
+    """
+    form_data = {}
+    missing_fields = []
+
+    for field in REQUIRED_FIELDS:
+        value = _clean(source.get(field))
+        if not value:
+            missing_fields.append(field)
+        form_data[field] = value
+
+    if missing_fields:
+        return None, f"Missing required fields: {', '.join(missing_fields)}"
+
+    # Convert numeric fields
+    try:
+        for field in FLOAT_FIELDS:
+            form_data[field] = float(form_data[field])
+        for field in INT_FIELDS:
+            form_data[field] = int(form_data[field])
+    except ValueError as e:
+        return None, f"Invalid number format: {str(e)}"
+
+    # Optional fields
+    for field in OPTIONAL_FIELDS:
+        form_data[field] = _clean(source.get(field))
+
+    return form_data, None
+
+
+def extract_file_passwords(source):
+    """Get the per-document passwords submitted alongside the files"""
+    return {
+        field: _clean(source.get(f'{field}_password', 'No password'))
+        for field in FILE_TYPES
+    }